@@ -1,23 +1,107 @@
 # backend/auth_utils.py
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import OAuth2PasswordBearer # Can be adapted for Bearer token
 import firebase_admin
-from firebase_admin import auth, credentials
+from firebase_admin import auth
+from services.clients import firebase_app
+from services.metrics import registry
 
-# Initialize Firebase Admin SDK if not already initialized
-# This might also be in your main.py or a services/firestore.py. Ensure it's initialized once.
-# GOOGLE_APPLICATION_CREDENTIALS should be set in your environment.
-if not firebase_admin._apps:
-    try:
-        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-        if not cred_path:
-            raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set.")
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-    except Exception as e:
-        print(f"Error initializing Firebase Admin SDK in auth_utils: {e}")
-        # Depending on your setup, you might want to raise the error or handle it
+
+def _verify_id_token(token: str, check_revoked: bool = False) -> dict:
+    # The firebase_admin app is shared with Firestore (services/clients.py)
+    return auth.verify_id_token(token, check_revoked=check_revoked, app=firebase_app())
+
+
+class VerifiedTokenCache:
+    """LRU cache of verified Firebase ID tokens.
+
+    Entries are keyed by a SHA-256 of the token (the raw token is never kept),
+    expire at the token's own ``exp`` claim, and are re-verified with
+    ``check_revoked=True`` once they are older than ``revocation_check_interval``
+    seconds. ``verifier`` defaults to Firebase's ``verify_id_token`` and can be swapped
+    for a local fake to measure the per-request auth cost.
+    """
+
+    def __init__(self, verifier=None, max_size=1024, revocation_check_interval=300, clock=time.time):
+        self._verifier = verifier or _verify_id_token
+        self.max_size = max_size
+        self.revocation_check_interval = revocation_check_interval
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (claims, expires_at, checked_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def verify(self, token: str) -> dict:
+        key = self._key(token)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                claims, expires_at, checked_at = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    self.misses += 1
+                elif now - checked_at < self.revocation_check_interval:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return claims
+                else:
+                    self.revalidations += 1
+
+        # Verification errors (revoked, invalid, expired) propagate and are never cached.
+        try:
+            claims = self._verifier(token, check_revoked=True)
+        except Exception:
+            with self._lock:
+                self._entries.pop(key, None)
+            raise
+
+        if self.max_size > 0 and self.revocation_check_interval > 0:
+            with self._lock:
+                self._entries[key] = (claims, claims.get("exp", 0), now)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidations
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = VerifiedTokenCache(
+    max_size=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024")),
+    revocation_check_interval=float(os.getenv("AUTH_REVOCATION_CHECK_SECONDS", "300")),
+)
+registry.register_cache("auth_token", token_cache.stats)
 
 # This scheme can be used to extract the token from the Authorization header
 # oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token") # tokenUrl is not used here
@@ -43,7 +127,8 @@ async def get_current_user(authorization: str | None = Header(default=None)):
 
     try:
         # Verify the ID token while checking if the token is revoked.
-        decoded_token = auth.verify_id_token(token, check_revoked=True)
+        # Served from token_cache until the token expires or its revocation re-check is due.
+        decoded_token = token_cache.verify(token)
         return decoded_token 
     except firebase_admin.auth.RevokedIdTokenError:
         # Token has been revoked, user needs to reauthenticate.
@@ -0,0 +1,6 @@
+# bench/
+#
+# Offline benchmark and load-test suite. Runs the FastAPI app in-process
+# against the in-memory Firestore fake (or the Firestore emulator) with a stub
+# Gemini model, seeds synthetic users and reports latency percentiles and
+# throughput per scenario. See bench/run.py for usage.
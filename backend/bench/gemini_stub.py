@@ -0,0 +1,82 @@
+# bench/gemini_stub.py
+#
+# Stand-in for google.generativeai.GenerativeModel with configurable latency,
+# so LLM-backed endpoints can be measured without network calls or quota.
+
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+
+class StubResponse:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+        )
+
+
+class StubStream:
+    """Async iterable of chunks, like a streamed Gemini response."""
+
+    def __init__(self, model, prompt: str, delay: float):
+        self._model = model
+        self._prompt = prompt
+        self._delay = delay
+        self.text = model.reply_for(prompt)
+        self.usage_metadata = StubResponse(self.text, prompt).usage_metadata
+
+    async def __aiter__(self):
+        words = self.text.split(" ")
+        size = max(1, len(words) // self._model.chunks)
+        chunks = [" ".join(words[i : i + size]) + " " for i in range(0, len(words), size)]
+        # The first token arrives after ~30% of the total latency
+        await asyncio.sleep(self._delay * 0.3)
+        for chunk in chunks:
+            await asyncio.sleep(self._delay * 0.7 / len(chunks))
+            yield SimpleNamespace(text=chunk)
+
+
+class StubModel:
+    """Answers every prompt after `latency_ms` (± `jitter_ms`)."""
+
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        jitter_ms: float = 0,
+        chunks: int = 8,
+        reply_words: int = 60,
+        seed: int = None,
+    ):
+        self.model_name = "stub-gemini"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunks = chunks
+        self.reply_words = reply_words
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _delay(self) -> float:
+        self.calls += 1
+        jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def reply_for(self, prompt: str) -> str:
+        words = ["Stub", "reply", f"for a {len(prompt)}-character prompt."]
+        words += ["Keep", "your", "installments", "below", "a", "third", "of", "income."] * (
+            self.reply_words // 8
+        )
+        return " ".join(words)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        time.sleep(self._delay())
+        return StubResponse(self.reply_for(prompt), prompt)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        delay = self._delay()
+        if stream:
+            return StubStream(self, prompt, delay)
+        await asyncio.sleep(delay)
+        return StubResponse(self.reply_for(prompt), prompt)
@@ -0,0 +1,226 @@
+# bench/run.py
+#
+# Benchmark the API in-process: seed synthetic users into the in-memory
+# Firestore fake (or the emulator when FIRESTORE_EMULATOR_HOST is set), swap
+# Gemini for a stub with configurable latency, then drive each scenario with
+# concurrent requests and report p50/p95/p99 latency and throughput.
+#
+#   python -m bench.run
+#   python -m bench.run --users 2 --transactions 100000 --scenarios transactions,risk
+#   python -m bench.run --json results.json
+#   python -m bench.run --compare results.json --tolerance 0.2   # exit 1 on regression
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from bench.scenarios import DEFAULT_SCENARIOS
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(name: str, latencies: list, errors: int, elapsed: float, extra: dict) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "scenario": name,
+        "requests": count,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": (sum(latencies) / count * 1000) if count else 0.0,
+        "max_ms": (latencies[-1] * 1000) if count else 0.0,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        **extra,
+    }
+
+
+async def run_scenario(client, name, scenario, users, requests, concurrency, warmup, rng, counters):
+    for i in range(warmup):
+        await scenario(client, users[i % len(users)], rng)
+
+    latencies = []
+    errors = 0
+    next_request = iter(range(requests))
+    before = counters()
+
+    async def worker():
+        nonlocal errors
+        for i in next_request:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, users[i % len(users)], rng)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    after = counters()
+    per_request = {
+        f"{key}_per_request": (after[key] - before[key]) / requests if requests else 0.0
+        for key in after
+    }
+    return summarize(name, latencies, errors, elapsed, per_request)
+
+
+def print_table(results: list) -> None:
+    columns = ("scenario", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+    extra = sorted({key for r in results for key in r if key.endswith("_per_request")})
+    header = columns + tuple(extra)
+    print("  ".join(f"{c:>18}" for c in header))
+    for result in results:
+        cells = []
+        for column in header:
+            value = result.get(column, "")
+            cells.append(f"{value:>18.1f}" if isinstance(value, float) else f"{value:>18}")
+        print("  ".join(cells))
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> list:
+    """Scenarios whose p95 grew by more than `tolerance` versus the baseline."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["scenario"])
+        if previous and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{result['scenario']}: p95 {previous['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DebtWatch API offline.")
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--transactions", type=int, default=10_000, help="Per user")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=200)
+    parser.add_argument(
+        "--firestore-latency-ms",
+        type=float,
+        default=5,
+        help="Per-RPC delay added by the in-memory fake",
+    )
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the Gemini response cache on")
+    parser.add_argument(
+        "--admission", action="store_true", help="Keep the per-user rate limits on"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results file to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+async def _run(args, app, users, counters) -> list:
+    import httpx
+    from bench.scenarios import SCENARIOS
+
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in args.scenarios.split(","):
+            results.append(
+                await run_scenario(
+                    client,
+                    name,
+                    SCENARIOS[name],
+                    users,
+                    args.requests,
+                    args.concurrency,
+                    args.warmup,
+                    rng,
+                    counters,
+                )
+            )
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Configure the app before importing it
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+    if not args.llm_cache:
+        os.environ["LLM_CACHE_BACKEND"] = "off"
+    if not args.admission:
+        os.environ["ADMISSION_RATE_PER_MINUTE"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("FIRESTORE_READS_HEADER", "1")
+
+    from auth_utils import get_current_user_uid
+    from bench.gemini_stub import StubModel
+    from bench.seed import seed_users
+    from bench.scenarios import SCENARIOS
+    from fastapi import Header
+    from main import app
+    from services.clients import FIRESTORE_BACKEND, get_gemini_model
+    from services.clients import registry as clients
+    from services.firestore import db
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    async def bench_user(x_bench_user: str = Header()) -> str:
+        return x_bench_user
+
+    app.dependency_overrides[get_current_user_uid] = bench_user
+    stub = StubModel(args.gemini_latency_ms, args.gemini_jitter_ms, seed=args.seed)
+    app.dependency_overrides[get_gemini_model] = lambda: stub
+
+    store = clients.get("memory_store") if FIRESTORE_BACKEND == "memory" else None
+    start = time.perf_counter()
+    users = seed_users(db, args.users, args.transactions, seed=args.seed)
+    print(
+        f"Seeded {args.users} users x {args.transactions} transactions"
+        f" in {time.perf_counter() - start:.1f}s"
+    )
+    if store is not None:
+        store.latency = args.firestore_latency_ms / 1000
+
+    def counters() -> dict:
+        values = {"gemini_calls": stub.calls}
+        if store is not None:
+            values["firestore_rpcs"] = store.rpcs
+        return values
+
+    results = asyncio.run(_run(args, app, users, counters))
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
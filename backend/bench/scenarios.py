@@ -0,0 +1,94 @@
+# bench/scenarios.py
+#
+# One request per call, against a seeded user. Each scenario takes an
+# httpx.AsyncClient, a SeededUser and a random.Random and returns the response.
+
+from datetime import datetime, timezone
+
+CHAT_QUESTIONS = (
+    "Bagaimana cara melunasi utang kartu kredit lebih cepat?",
+    "Apakah cicilan saya terlalu besar dibanding pemasukan?",
+    "Berapa dana darurat yang sebaiknya saya siapkan?",
+    "Should I refinance my car loan?",
+)
+
+
+def _headers(user) -> dict:
+    # bench/run.py swaps Firebase token verification for this header
+    return {"X-Bench-User": user.user_id}
+
+
+async def transactions(client, user, rng):
+    """First page of the transaction list."""
+    return await client.get(
+        f"/users/{user.user_id}/transactions",
+        params={"limit": 50},
+        headers=_headers(user),
+    )
+
+
+async def transactions_all(client, user, rng):
+    """The legacy unpaginated list (every transaction)."""
+    return await client.get(
+        f"/users/{user.user_id}/transactions", headers=_headers(user)
+    )
+
+
+async def risk(client, user, rng):
+    """Risk generation including the Gemini explanation."""
+    return await client.post(
+        f"/users/{user.user_id}/risk_scores/generate",
+        params={"explain": "true"},
+        headers=_headers(user),
+    )
+
+
+async def risk_force(client, user, rng):
+    """Risk generation that skips the stored score."""
+    return await client.post(
+        f"/users/{user.user_id}/risk_scores/generate",
+        params={"explain": "true", "force": "true"},
+        headers=_headers(user),
+    )
+
+
+async def chat(client, user, rng):
+    return await client.post(
+        f"/users/{user.user_id}/chatrooms/{user.room_id}/messages",
+        json={
+            "message": rng.choice(CHAT_QUESTIONS),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        headers=_headers(user),
+    )
+
+
+async def assets(client, user, rng):
+    """Save the portfolio with one price changed, as the assets page does."""
+    portfolio = [dict(asset) for asset in user.assets]
+    changed = rng.choice(portfolio)
+    changed["hargaJual"] = [changed["hargaJual"][0] * rng.uniform(0.9, 1.1)]
+    return await client.post(
+        f"/users/{user.user_id}/assets",
+        json={"assets": portfolio},
+        headers=_headers(user),
+    )
+
+
+async def dashboard(client, user, rng):
+    """The home screen's single request."""
+    return await client.get(
+        f"/users/{user.user_id}/dashboard", headers=_headers(user)
+    )
+
+
+SCENARIOS = {
+    "transactions": transactions,
+    "transactions_all": transactions_all,
+    "risk": risk,
+    "risk_force": risk_force,
+    "chat": chat,
+    "assets": assets,
+    "dashboard": dashboard,
+}
+DEFAULT_SCENARIOS = ("transactions", "risk", "chat", "assets", "dashboard")
@@ -0,0 +1,136 @@
+# bench/seed.py
+#
+# Synthetic users shaped like the frontend's data: a profile, N transactions
+# spread over the last year, a few loans and assets, dependents, credit
+# history and one chatroom. Writes go through the regular client (in batches
+# of 500), so the same seeding works against the fake and the emulator.
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from services.aggregates import rebuild_aggregates
+
+BATCH_SIZE = 500
+
+EXPENSE_CATEGORIES = ("makanan", "transportasi", "tagihan", "belanja", "hiburan")
+INCOME_CATEGORIES = ("gaji", "bonus", "usaha")
+LOAN_TYPES = ("KPR", "kendaraan", "kartu kredit", "pinjaman online")
+ASSET_NAMES = ("Motor", "Mobil", "Emas", "Laptop", "Tabungan")
+
+
+@dataclass
+class SeededUser:
+    user_id: str
+    room_id: str
+    assets: list = field(default_factory=list)
+
+
+def _commit_in_batches(db, writes) -> None:
+    batch = db.batch()
+    pending = 0
+    for ref, data in writes:
+        batch.set(ref, data)
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+
+def _transactions(user_ref, count: int, rng: random.Random, now: datetime):
+    for _ in range(count):
+        income = rng.random() < 0.3
+        yield user_ref.collection("transactions").document(), {
+            "amount": float(rng.randrange(10_000, 5_000_000 if income else 500_000, 1_000)),
+            "category": rng.choice(INCOME_CATEGORIES if income else EXPENSE_CATEGORIES),
+            "note": None,
+            "type": "income" if income else "expense",
+            "created_at": now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+        }
+
+
+def seed_user(db, index: int, transactions: int, rng: random.Random) -> SeededUser:
+    user_id = f"bench-user-{index:04d}"
+    user_ref = db.collection("users").document(user_id)
+    now = datetime.now(timezone.utc)
+
+    writes = [
+        (
+            user_ref,
+            {
+                "full_name": f"Bench User {index}",
+                "age": rng.randrange(21, 60),
+                "occupation": rng.choice(("karyawan", "wiraswasta", "freelancer")),
+                "marital_status": rng.choice(("single", "married")),
+                "location": "Jakarta",
+                "email": f"{user_id}@example.com",
+            },
+        ),
+        (
+            user_ref.collection("financial_dependents").document("main"),
+            {"dependents_count": rng.randrange(0, 4)},
+        ),
+        (
+            user_ref.collection("credit_history").document("main"),
+            {
+                "total_loans_taken": rng.randrange(0, 6),
+                "missed_payments": rng.randrange(0, 3),
+                "has_default_history": rng.random() < 0.1,
+            },
+        ),
+        (
+            user_ref.collection("chatrooms").document("bench"),
+            {
+                "name": "Benchmark",
+                "created_at": now.isoformat(),
+                "message_count": 0,
+                "unread_count": 0,
+            },
+        ),
+    ]
+
+    for _ in range(rng.randrange(1, 4)):
+        total = rng.choice((12, 24, 36, 60))
+        paid = rng.randrange(0, total)
+        loan_ref = user_ref.collection("loans").document()
+        writes.append(
+            (
+                loan_ref,
+                {
+                    "id": loan_ref.id,
+                    "loan_type": rng.choice(LOAN_TYPES),
+                    "cicilanPerbulan": float(rng.randrange(200_000, 5_000_000, 50_000)),
+                    "cicilanTotalBulan": total,
+                    "cicilanSudahDibayar": paid,
+                    "is_active": paid < total,
+                    "created_at": now,
+                },
+            )
+        )
+
+    assets = [
+        {
+            "id": f"asset-{i}",
+            "displayName": name,
+            "jumlah": 1,
+            "hargaJual": [float(rng.randrange(1_000_000, 200_000_000, 500_000))],
+            "isCustom": False,
+        }
+        for i, name in enumerate(rng.sample(ASSET_NAMES, 3))
+    ]
+    writes += [
+        (user_ref.collection("assets").document(asset["id"]), asset) for asset in assets
+    ]
+
+    _commit_in_batches(db, writes)
+    _commit_in_batches(db, _transactions(user_ref, transactions, rng, now))
+    rebuild_aggregates(user_id)
+    return SeededUser(user_id=user_id, room_id="bench", assets=assets)
+
+
+def seed_users(db, users: int, transactions: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [seed_user(db, index, transactions, rng) for index in range(users)]
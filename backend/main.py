@@ -1,22 +1,88 @@
 # main.py
 
-from fastapi import FastAPI
+import time
+
+# Worker boot is measured from here: importing the routers and services
+# should stay cheap, since clients are only created on first use.
+_import_started = time.perf_counter()
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from routes import (
     assets,
     chat,
     credit_history,
+    dashboard,
     financial_dependents,
+    jobs,
     loans,
     risk_score,
     transactions,
     users,
 )
+from services.clients import WARM_UP
+from services.clients import registry as clients
+from services.firestore import (
+    begin_request_reads,
+    current_request_reads,
+    end_request_reads,
+)
+from services.jobs import start_workers, stop_workers
+from services.log import configure_logging, get_logger
+from services.metrics import (
+    app_startup_duration,
+    firestore_reads_per_request,
+    http_request_duration,
+    registry,
+)
+
+configure_logging()
+logger = get_logger(__name__)
+
+# Per-request read counts as a response header, for local profiling and the
+# bench harness; production relies on firestore_document_reads_per_request.
+FIRESTORE_READS_HEADER = os.getenv("FIRESTORE_READS_HEADER", "0") == "1"
+
+
+async def _warm_up_clients():
+    start = time.perf_counter()
+    await asyncio.to_thread(clients.warm_up, WARM_UP)
+    app_startup_duration.set(time.perf_counter() - start, phase="warmup")
+    logger.info(
+        "app.clients_ready",
+        extra={"fields": {"init_ms": {k: round(v, 1) for k, v in clients.init_ms.items()}}},
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    import_seconds = time.perf_counter() - _import_started
+    app_startup_duration.set(import_seconds, phase="import")
+    logger.info("app.started", extra={"fields": {"import_ms": round(import_seconds * 1000, 1)}})
+
+    # Create Firestore and Gemini clients in the background so the worker
+    # accepts requests right away; a request that needs one first waits for it.
+    warm_up = None
+    if os.getenv("CLIENTS_WARMUP", "1") != "0":
+        warm_up = asyncio.create_task(_warm_up_clients())
+    # Background job workers (JOBS_WORKERS=0 when they run as their own process)
+    start_workers()
+    yield
+    if warm_up is not None and not warm_up.done():
+        warm_up.cancel()
+    await asyncio.to_thread(stop_workers)
+
 
 app = FastAPI(
     title="DebtWatch API",
     description="Backend API untuk analisis risiko keuangan pengguna berbasis AI",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Define allowed origins for CORS
@@ -37,6 +103,42 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    # Request-scoped identity map for document reads (services/firestore.py)
+    reads_token = begin_request_reads()
+    reads = current_request_reads()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if FIRESTORE_READS_HEADER:
+            response.headers["X-Firestore-Reads"] = ", ".join(
+                f"{kind}={value}" for kind, value in reads.stats().items()
+            )
+        return response
+    finally:
+        end_request_reads(reads_token)
+        # Label by route template (/users/{user_id}/...) to keep cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route,
+            status=status,
+        )
+        for kind, value in reads.stats().items():
+            firestore_reads_per_request.observe(value, route=route, kind=kind)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 # Register semua endpoint
 app.include_router(users.router)
 app.include_router(chat.router)
@@ -47,3 +149,5 @@ app.include_router(credit_history.router)
 app.include_router(risk_score.router)
 app.include_router(loans.router)
 app.include_router(assets.router)
+app.include_router(dashboard.router)
+app.include_router(jobs.router)
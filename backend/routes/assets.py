@@ -1,35 +1,136 @@
 # routes/assets.py
 
+import re
 from datetime import datetime
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from services.aggregates import set_asset_totals
 from services.firestore import db
+from services.metrics import observe_firestore
+from services.user_cache import cached, invalidate
 
 router = APIRouter()
 
+# Firestore caps a batch at 500 writes
+BATCH_SIZE = 500
+
+# Firestore document ID limits
+MAX_DOCUMENT_ID_BYTES = 1500
+_RESERVED_ID = re.compile(r"__.*__")
+
+
+def _load_assets(user_id: str) -> list:
+    ref = db.collection("users").document(user_id).collection("assets")
+    # Return the document ID so the next save can update in place
+    with observe_firestore("assets", "query"):
+        return [{"id": doc.id, **doc.to_dict()} for doc in ref.stream()]
+
 
 @router.get("/users/{user_id}/assets")
 def get_assets(user_id: str):
-    ref = db.collection("users").document(user_id).collection("assets")
-    docs = ref.stream()
-    return [doc.to_dict() for doc in docs]
+    return cached(user_id, "assets", lambda: _load_assets(user_id))
 
 
-@router.post("/users/{user_id}/assets")
-async def save_assets(user_id: str, request: Request):
-    data = await request.json()
-    assets = data.get("assets", [])
+def _document_id_error(doc_id: str):
+    """Why Firestore would reject `doc_id` as a document ID, or None."""
+    if "/" in doc_id:
+        return "must not contain '/'"
+    if doc_id in (".", ".."):
+        return "must not be '.' or '..'"
+    if _RESERVED_ID.fullmatch(doc_id):
+        return "must not match __.*__"
+    if len(doc_id.encode("utf-8")) > MAX_DOCUMENT_ID_BYTES:
+        return f"must be at most {MAX_DOCUMENT_ID_BYTES} bytes"
+    return None
+
+
+def _diff_assets(existing: dict, assets: list, assets_ref) -> tuple:
+    """Compare the submitted portfolio with the stored one.
 
-    batch = db.batch()
+    `existing` maps document ID -> stored data. A submitted asset matches a
+    stored one by document ID, or by the `id` field the frontend kept for
+    assets saved before documents were keyed by it. Returns
+    (the portfolio to keep, upserts as (ref, data), refs to delete, unchanged count).
+
+    Raises 400 for a new asset whose ID Firestore would reject, before any
+    batch of a multi-batch save is committed.
+    """
+    by_client_id = {
+        data["id"]: doc_id
+        for doc_id, data in existing.items()
+        if isinstance(data.get("id"), str)
+    }
+    portfolio = []
+    upserts = []
+    kept = set()
+    unchanged = 0
+    for index, asset in enumerate(assets):
+        asset_id = asset.get("id")
+        if isinstance(asset_id, str) and asset_id in existing:
+            doc_id = asset_id
+        elif isinstance(asset_id, str) and asset_id in by_client_id:
+            doc_id = by_client_id[asset_id]
+        elif isinstance(asset_id, str) and asset_id:
+            error = _document_id_error(asset_id)
+            if error:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid id for asset {index}: {error}"
+                )
+            doc_id = asset_id
+        else:
+            doc_id = assets_ref.document().id
+            asset = {**asset, "id": doc_id}
+
+        if doc_id in kept:
+            continue  # the same asset submitted twice
+        kept.add(doc_id)
+        portfolio.append(asset)
+        if existing.get(doc_id) == asset:
+            unchanged += 1
+        else:
+            upserts.append((assets_ref.document(doc_id), asset))
+
+    deletes = [assets_ref.document(doc_id) for doc_id in existing if doc_id not in kept]
+    return portfolio, upserts, deletes, unchanged
+
+
+def _save_assets(user_id: str, assets: list) -> dict:
     assets_ref = db.collection("users").document(user_id).collection("assets")
+    with observe_firestore("assets", "query"):
+        existing = {doc.id: doc.to_dict() for doc in assets_ref.stream()}
+    portfolio, upserts, deletes, unchanged = _diff_assets(existing, assets, assets_ref)
+
+    writes = [lambda batch, r=ref, d=data: batch.set(r, d) for ref, data in upserts]
+    writes += [lambda batch, r=ref: batch.delete(r) for ref in deletes]
+    if writes:
+        # The total goes into the last batch, after every asset write in it
+        writes.append(lambda batch: set_asset_totals(batch, user_id, portfolio))
 
-    existing_assets = assets_ref.stream()
-    for doc in existing_assets:
-        batch.delete(doc.reference)
+    # Portfolios past the batch limit are committed in several batches, in order
+    for start in range(0, len(writes), BATCH_SIZE):
+        batch = db.batch()
+        for write in writes[start : start + BATCH_SIZE]:
+            write(batch)
+        with observe_firestore("assets", "commit"):
+            batch.commit()
 
-    for asset in assets:
-        doc_ref = assets_ref.document()
-        batch.set(doc_ref, asset)
+    inserted = sum(1 for ref, _ in upserts if ref.id not in existing)
+    return {
+        "writes": len(writes),
+        "inserted": inserted,
+        "updated": len(upserts) - inserted,
+        "deleted": len(deletes),
+        "unchanged": unchanged,
+    }
+
+
+@router.post("/users/{user_id}/assets")
+async def save_assets(user_id: str, request: Request):
+    """Save the whole portfolio, writing only the assets that changed."""
+    data = await request.json()
+    assets = data.get("assets", [])
 
-    batch.commit()
-    return {"status": "success", "message": "Assets saved successfully."}
+    result = await run_in_threadpool(_save_assets, user_id, assets)
+    invalidate(user_id, "assets")
+    return {"status": "success", "message": "Assets saved successfully.", **result}
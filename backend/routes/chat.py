@@ -1,18 +1,40 @@
-import os
-from datetime import datetime
+import json
+import time
+from datetime import datetime, timezone
 from typing import List, Optional
 
-import google.generativeai as genai
+from auth_utils import get_current_user_uid
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+)
+from fastapi.responses import StreamingResponse
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
 from pydantic import BaseModel
-from services.firestore import db
+from services.admission import flights, rate_limit
+from services.aggregates import aggregates_ref
+from services.chat_context import build_chat_context
+from services.chat_memory import render_memory, update_memory
+from services.clients import get_gemini_model
+from services.firestore import (
+    async_db,
+    forget,
+    get_document_async,
+    get_documents_async,
+)
+from services.llm_cache import generate_cached_async, stream_cached_async
+from services.log import get_logger
+from services.metrics import observe_firestore
 
 load_dotenv()
 router = APIRouter()
-
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.0-flash")
+logger = get_logger(__name__)
 
 
 # =============== Pydantic Models for Request/Response ===============
@@ -37,6 +59,8 @@ class ChatRoom(BaseModel):
     created_at: str
     last_message: Optional[str] = None
     last_message_time: Optional[str] = None
+    message_count: int = 0
+    unread_count: int = 0
 
 
 class ChatRoomCreate(BaseModel):
@@ -56,92 +80,7 @@ class MessageUpdate(BaseModel):
 # =============== Utility Functions ===============
 
 
-def get_user_profile(user_id: str) -> dict:
-    doc = db.collection("users").document(user_id).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="User not found")
-    return doc.to_dict()
-
-
-def get_user_loans(user_id: str) -> list:
-    return [
-        doc.to_dict()
-        for doc in db.collection("users").document(user_id).collection("loans").stream()
-    ]
-
-
-def get_user_assets(user_id: str) -> list:
-    return [
-        doc.to_dict()
-        for doc in db.collection("users")
-        .document(user_id)
-        .collection("assets")
-        .stream()
-    ]
-
-
-def get_user_transactions(user_id: str) -> list:
-    return [
-        doc.to_dict()
-        for doc in db.collection("users")
-        .document(user_id)
-        .collection("transactions")
-        .stream()
-    ]
-
-
-def build_user_profile_summary(user_id: str) -> str:
-    profile = get_user_profile(user_id)
-    loans = get_user_loans(user_id)
-    transactions = get_user_transactions(user_id)
-    assets = get_user_assets(user_id)
-
-    income = sum(t.get("amount", 0) for t in transactions if t.get("type") == "income")
-    expense = sum(
-        t.get("amount", 0) for t in transactions if t.get("type") == "expense"
-    )
-
-    total_cicilan_perbulan = sum(loan.get("cicilanPerbulan", 0) for loan in loans)
-    total_utang = sum(
-        loan.get("cicilanPerbulan", 0)
-        * (loan.get("cicilanTotalBulan", 0) - loan.get("cicilanSudahDibayar", 0))
-        for loan in loans
-    )
-
-    summary = f"""
-    User Profile:
-    - Profile: {profile}
-
-    Assets:
-    {chr(10).join([
-        f"- {a.get('name', 'Unknown')}: Rp{a.get('value', 0)}"
-        for a in assets
-    ]) or 'No assets.'}
-
-    Recent Transaction History:
-    {chr(10).join([
-        f"- {t.get('type', 'unknown')}: Rp{t.get('amount', 0)} for {t.get('category', 'unknown')}"
-        for t in transactions
-    ]) or 'No transactions.'}
-
-    Active Loans:
-    {chr(10).join([
-        f"- {l.get('loan_type', 'unknown')}: Installment Rp{l.get('cicilanPerbulan', 0)} for {l.get('cicilanTotalBulan', 0)} months (remaining {l.get('cicilanTotalBulan', 0) - l.get('cicilanSudahDibayar', 0)} months)"
-        for l in loans
-    ]) or 'No active loans.'}
-
-    Financial Summary:
-    - Total Income: Rp{income}
-    - Total Expenses: Rp{expense}
-    - Total Monthly Installments: Rp{total_cicilan_perbulan}
-    - Total Remaining Debt: Rp{total_utang}
-    """
-
-    return summary.strip()
-
-
-def generate_ai_response(user_profile: str, message: str) -> str:
-    """Generate AI response using Gemini API"""
+def build_chat_prompt(user_profile: str, message: str, memory: str = "") -> str:
     system_instruction = (
         "You are DebtBot, a virtual personal finance assistant. "
         "Only answer questions related to finance, debt, spending, or financial advice. "
@@ -150,13 +89,19 @@ def generate_ai_response(user_profile: str, message: str) -> str:
         "Use formal yet approachable language.\n\n"
     )
 
-    prompt = f"{system_instruction}{user_profile}User: {message}"
+    return f"{system_instruction}{user_profile}{memory}User: {message}"
+
+
+async def generate_ai_response(
+    model, user_profile: str, message: str, memory: str = ""
+) -> str:
+    """Generate AI response using Gemini API without blocking the event loop"""
+    prompt = build_chat_prompt(user_profile, message, memory)
 
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        return await generate_cached_async(model, prompt)
     except Exception as e:
-        print(f"Error generating AI response: {e}")
+        logger.error("chat.ai_response_failed", extra={"fields": {"error": str(e)}})
         raise HTTPException(
             status_code=500, detail=f"Failed to generate AI response: {str(e)}"
         )
@@ -165,36 +110,110 @@ def generate_ai_response(user_profile: str, message: str) -> str:
 # =============== API Endpoints ===============
 
 
-@router.post("/api/chat")
-async def chat(request: ChatRequest, user_id: str):
+@router.post("/api/chat", dependencies=[Depends(rate_limit("chat"))])
+async def chat(
+    request: ChatRequest,
+    user_id: str,
+    model=Depends(get_gemini_model),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
     """Legacy chat endpoint that will be maintained for backward compatibility"""
-    print(f"Received request for user {request.user_id}: {request.message}")
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only chat as yourself.",
+        )
+    logger.debug(
+        "chat.legacy_request",
+        extra={"fields": {"user_id": user_id, "message_chars": len(request.message)}},
+    )
 
     try:
-        user_profile = build_user_profile_summary(user_id)
-        reply_text = generate_ai_response(user_profile, request.message)
-        print(f"AI Response: {reply_text}")
+        user_profile = await build_chat_context(user_id)
+        reply_text = await generate_ai_response(model, user_profile, request.message)
         return {"reply": reply_text}
     except Exception as e:
-        print(f"Exception in chat: {str(e)}")
+        logger.exception("chat.legacy_failed", extra={"fields": {"user_id": user_id}})
         return {"error": str(e)}
 
 
+def _utc_timestamp(value: Optional[str] = None) -> str:
+    """An ISO timestamp in the client's format (UTC, milliseconds, "Z").
+
+    Message timestamps are compared as strings by the before/after cursors, so
+    every stored timestamp has to use the same format. Without a value, now;
+    a value that doesn't parse is returned unchanged.
+    """
+    if value is None:
+        moment = datetime.now(timezone.utc)
+    else:
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+    return (
+        moment.astimezone(timezone.utc)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+async def _backfill_message_count(chatroom_ref) -> int:
+    """Count and store the messages of a room created before message_count.
+
+    The count is only stored while the field is still missing, so a send that
+    backfilled and incremented it in the meantime is never overwritten.
+    """
+    with observe_firestore("messages", "count"):
+        result = await chatroom_ref.collection("messages").count().get()
+    count = int(result[0][0].value)
+
+    @firestore.async_transactional
+    async def store(transaction):
+        room = await chatroom_ref.get(transaction=transaction)
+        current = (room.to_dict() or {}).get("message_count")
+        if current is not None:
+            return current
+        transaction.update(chatroom_ref, {"message_count": count})
+        return count
+
+    with observe_firestore("chatrooms", "transaction"):
+        return await store(async_db.transaction())
+
+
 # =============== Chatroom Endpoints ===============
 
 
 @router.get("/users/{user_id}/chatrooms")
-async def get_user_chatrooms(user_id: str) -> List[ChatRoom]:
-    """Get all chat rooms for a user"""
+async def get_user_chatrooms(
+    user_id: str,
+    limit: Optional[int] = Query(default=None, ge=1, le=100),
+    before: Optional[str] = Query(
+        default=None, description="Only rooms created before this created_at"
+    ),
+) -> List[ChatRoom]:
+    """Get chat rooms for a user, newest first, with message/unread counters"""
     try:
-        chatrooms_ref = db.collection("users").document(user_id).collection("chatrooms")
-        chatrooms = chatrooms_ref.order_by(
-            "created_at", direction="DESCENDING"
-        ).stream()
+        chatrooms_ref = (
+            async_db.collection("users").document(user_id).collection("chatrooms")
+        )
+        query = chatrooms_ref.order_by("created_at", direction="DESCENDING")
+        if before:
+            query = query.where(filter=FieldFilter("created_at", "<", before))
+        if limit:
+            query = query.limit(limit)
+
+        with observe_firestore("chatrooms", "query"):
+            rooms = [room async for room in query.stream()]
 
         results = []
-        for room in chatrooms:
+        for room in rooms:
             room_data = room.to_dict()
+            message_count = room_data.get("message_count")
+            if message_count is None:
+                message_count = await _backfill_message_count(room.reference)
             results.append(
                 ChatRoom(
                     id=room.id,
@@ -202,6 +221,8 @@ async def get_user_chatrooms(user_id: str) -> List[ChatRoom]:
                     created_at=room_data.get("created_at", ""),
                     last_message=room_data.get("last_message"),
                     last_message_time=room_data.get("last_message_time"),
+                    message_count=message_count,
+                    unread_count=room_data.get("unread_count", 0),
                 )
             )
 
@@ -217,8 +238,8 @@ async def create_chatroom(user_id: str, chatroom: ChatRoomCreate) -> ChatRoom:
     """Create a new chat room for a user"""
     try:
         # Check if user exists
-        user_ref = db.collection("users").document(user_id)
-        if not user_ref.get().exists:
+        user_ref = async_db.collection("users").document(user_id)
+        if not (await get_document_async(user_ref)).exists:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Create new chatroom document
@@ -227,9 +248,12 @@ async def create_chatroom(user_id: str, chatroom: ChatRoomCreate) -> ChatRoom:
         chatroom_data = {
             "name": chatroom.name,
             "created_at": chatroom.created_at,
+            "message_count": 0,
+            "unread_count": 0,
         }
 
-        chatroom_ref.set(chatroom_data)
+        with observe_firestore("chatrooms", "set"):
+            await chatroom_ref.set(chatroom_data)
 
         # Return the created chatroom with its ID
         return ChatRoom(
@@ -244,21 +268,60 @@ async def create_chatroom(user_id: str, chatroom: ChatRoomCreate) -> ChatRoom:
 
 
 @router.get("/users/{user_id}/chatrooms/{room_id}/messages")
-async def get_chat_messages(user_id: str, room_id: str) -> List[ChatMessage]:
-    """Get all messages for a specific chat room"""
+async def get_chat_messages(
+    user_id: str,
+    room_id: str,
+    limit: Optional[int] = Query(default=None, ge=1, le=200),
+    before: Optional[str] = Query(
+        default=None, description="Only messages with timestamp before this value"
+    ),
+    after: Optional[str] = Query(
+        default=None, description="Only messages with timestamp after this value"
+    ),
+    include_archived: bool = True,
+) -> List[ChatMessage]:
+    """Get messages for a chat room in chronological order.
+
+    With `limit` the newest page is returned (or the page just before
+    `before` / just after `after`). Loading the newest page marks the room read.
+    """
     try:
-        # Verify user and chatroom
-        user_ref = db.collection("users").document(user_id)
+        # Verify user and chatroom with a single batched read
+        user_ref = async_db.collection("users").document(user_id)
         chatroom_ref = user_ref.collection("chatrooms").document(room_id)
+        user, chatroom = await get_documents_async([user_ref, chatroom_ref])
 
-        if not user_ref.get().exists:
+        if not user.exists:
             raise HTTPException(status_code=404, detail="User not found")
-        if not chatroom_ref.get().exists:
+        if not chatroom.exists:
             raise HTTPException(status_code=404, detail="Chat room not found")
 
-        # Get messages
-        messages_ref = chatroom_ref.collection("messages")
-        messages = messages_ref.order_by("timestamp").stream()
+        query = chatroom_ref.collection("messages")
+        if not include_archived:
+            query = query.where(filter=FieldFilter("archived", "==", False))
+        if after:
+            query = query.where(
+                filter=FieldFilter("timestamp", ">", _utc_timestamp(after))
+            )
+        if before:
+            query = query.where(
+                filter=FieldFilter("timestamp", "<", _utc_timestamp(before))
+            )
+
+        # Paging backwards from the newest (or from `before`) needs a
+        # descending query; the page is flipped back to chronological order.
+        newest_first = limit is not None and after is None
+        query = query.order_by(
+            "timestamp",
+            direction=(
+                firestore.Query.DESCENDING if newest_first else firestore.Query.ASCENDING
+            ),
+        )
+        if limit:
+            query = query.limit(limit)
+
+        with observe_firestore("messages", "query"):
+            messages = [msg async for msg in query.stream()]
 
         results = []
         for msg in messages:
@@ -272,6 +335,13 @@ async def get_chat_messages(user_id: str, room_id: str) -> List[ChatMessage]:
                     archived=msg_data.get("archived", False),
                 )
             )
+        if newest_first:
+            results.reverse()
+
+        if before is None and chatroom.to_dict().get("unread_count", 0):
+            with observe_firestore("chatrooms", "update"):
+                await chatroom_ref.update({"unread_count": 0})
+            forget(chatroom_ref)
 
         return results
     except HTTPException as e:
@@ -282,73 +352,229 @@ async def get_chat_messages(user_id: str, room_id: str) -> List[ChatMessage]:
         )
 
 
-@router.post("/users/{user_id}/chatrooms/{room_id}/messages")
-async def send_chat_message(
-    user_id: str, room_id: str, message_req: MessageCreate
-) -> ChatMessage:
-    """Send a message to a chat room and get AI response"""
-    try:
-        # Verify user and chatroom
-        user_ref = db.collection("users").document(user_id)
-        chatroom_ref = user_ref.collection("chatrooms").document(room_id)
-
-        if not user_ref.get().exists:
-            raise HTTPException(status_code=404, detail="User not found")
-        if not chatroom_ref.get().exists:
-            raise HTTPException(status_code=404, detail="Chat room not found")
-
-        # Generate ID for user message
-        message_ref = chatroom_ref.collection("messages").document()
+async def _load_room_and_context(user_ref, chatroom_ref):
+    """Read the chatroom and build the user context.
 
-        # Store user message
-        user_message_data = {
+    The chatroom, user and aggregates documents are fetched in one get_all();
+    build_chat_context() then finds the latter two in the request's identity
+    map, and doubles as the user existence check (404 "User not found").
+    """
+    chatroom, _, _ = await get_documents_async(
+        [chatroom_ref, user_ref, aggregates_ref(user_ref.id, client=async_db)]
+    )
+    user_profile = await build_chat_context(user_ref.id)
+    if not chatroom.exists:
+        raise HTTPException(status_code=404, detail="Chat room not found")
+    if "message_count" not in chatroom.to_dict():
+        # Legacy room: count first, or the Increment below would start from 0
+        await _backfill_message_count(chatroom_ref)
+    return chatroom, user_profile
+
+
+async def _commit_exchange(chatroom_ref, message_req: MessageCreate, ai_response: str):
+    """Write the user message, AI message and room metadata in one batch."""
+    user_message_ref = chatroom_ref.collection("messages").document()
+    ai_message_ref = chatroom_ref.collection("messages").document()
+    user_timestamp = _utc_timestamp(message_req.timestamp)
+    ai_message_data = {
+        "text": ai_response,
+        "isUser": False,
+        "timestamp": _utc_timestamp(),
+        "archived": False,
+    }
+
+    batch = async_db.batch()
+    batch.set(
+        user_message_ref,
+        {
             "text": message_req.message,
             "isUser": True,
-            "timestamp": message_req.timestamp,
+            "timestamp": user_timestamp,
             "archived": False,
-        }
+        },
+    )
+    batch.set(ai_message_ref, ai_message_data)
+    batch.update(
+        chatroom_ref,
+        {
+            "last_message": message_req.message,
+            "last_message_time": user_timestamp,
+            "message_count": firestore.Increment(2),
+            "unread_count": firestore.Increment(1),
+        },
+    )
+    with observe_firestore("messages", "commit"):
+        await batch.commit()
+    forget(chatroom_ref)
 
-        message_ref.set(user_message_data)
+    return ChatMessage(id=ai_message_ref.id, **ai_message_data)
 
-        # Get user profile for AI context
-        user_profile = build_user_profile_summary(user_id)
 
-        # Generate AI response
-        ai_response = generate_ai_response(user_profile, message_req.message)
-
-        # Store AI response
-        ai_message_ref = chatroom_ref.collection("messages").document()
-        ai_message_data = {
-            "text": ai_response,
-            "isUser": False,
-            "timestamp": datetime.now().isoformat(),
-            "archived": False,
-        }
+async def _send_chat_message(
+    user_id: str,
+    room_id: str,
+    message_req: MessageCreate,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    model,
+) -> ChatMessage:
+    try:
+        started = time.perf_counter()
+        user_ref = async_db.collection("users").document(user_id)
+        chatroom_ref = user_ref.collection("chatrooms").document(room_id)
 
-        ai_message_ref.set(ai_message_data)
+        chatroom, user_profile = await _load_room_and_context(user_ref, chatroom_ref)
+        reads_done = time.perf_counter()
 
-        # Update chatroom with last message info
-        chatroom_ref.update(
-            {
-                "last_message": message_req.message,
-                "last_message_time": message_req.timestamp,
-            }
+        # Generate AI response
+        ai_response = await generate_ai_response(
+            model,
+            user_profile,
+            message_req.message,
+            render_memory(chatroom.to_dict()),
+        )
+        llm_done = time.perf_counter()
+
+        ai_message = await _commit_exchange(chatroom_ref, message_req, ai_response)
+        commit_done = time.perf_counter()
+
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={duration * 1000:.1f}"
+            for name, duration in (
+                ("reads", reads_done - started),
+                ("llm", llm_done - reads_done),
+                ("commit", commit_done - llm_done),
+                ("total", commit_done - started),
+            )
         )
 
-        # Return the AI message
-        return ChatMessage(
-            id=ai_message_ref.id,
-            text=ai_response,
-            isUser=False,
-            timestamp=ai_message_data["timestamp"],
-            archived=False,
+        # Fold this exchange into the room's memory after responding
+        background_tasks.add_task(
+            update_memory, model, chatroom_ref, message_req.message, ai_response
         )
+
+        return ai_message
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
 
 
+@router.post(
+    "/users/{user_id}/chatrooms/{room_id}/messages",
+    dependencies=[Depends(rate_limit("chat"))],
+)
+async def send_chat_message(
+    user_id: str,
+    room_id: str,
+    message_req: MessageCreate,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    model=Depends(get_gemini_model),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+) -> ChatMessage:
+    """Send a message to a chat room and get AI response.
+
+    Nothing is written until the AI reply exists; the exchange is then
+    committed atomically. Phase timings are returned in `Server-Timing`.
+    The same message sent again while the first is in flight (a double tap,
+    a second tab) gets the same reply instead of a second exchange.
+    """
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only send messages to your own chat rooms.",
+        )
+    return await flights.do(
+        ("chat", user_id, room_id, message_req.message),
+        lambda: _send_chat_message(
+            user_id, room_id, message_req, background_tasks, response, model
+        ),
+        scope="chat",
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post(
+    "/users/{user_id}/chatrooms/{room_id}/messages/stream",
+    dependencies=[Depends(rate_limit("chat"))],
+)
+async def stream_chat_message(
+    user_id: str,
+    room_id: str,
+    message_req: MessageCreate,
+    model=Depends(get_gemini_model),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+) -> StreamingResponse:
+    """Send a message and stream the AI reply as server-sent events.
+
+    Emits `token` events with text chunks as Gemini produces them, then a
+    `done` event carrying the stored ChatMessage (or an `error` event).
+    """
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only send messages to your own chat rooms.",
+        )
+    user_ref = async_db.collection("users").document(user_id)
+    chatroom_ref = user_ref.collection("chatrooms").document(room_id)
+
+    chatroom, user_profile = await _load_room_and_context(user_ref, chatroom_ref)
+    prompt = build_chat_prompt(
+        user_profile, message_req.message, render_memory(chatroom.to_dict())
+    )
+
+    async def event_stream():
+        started = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        try:
+            async for text in stream_cached_async(model, prompt):
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        except Exception as e:
+            logger.error(
+                "chat.stream_failed",
+                extra={"fields": {"user_id": user_id, "error": str(e)}},
+            )
+            yield _sse("error", {"detail": f"Failed to generate AI response: {e}"})
+            return
+
+        # Persist the whole exchange once the stream is complete
+        ai_response = "".join(parts)
+        try:
+            message = await _commit_exchange(chatroom_ref, message_req, ai_response)
+        except Exception as e:
+            logger.error(
+                "chat.stream_commit_failed",
+                extra={"fields": {"user_id": user_id, "error": str(e)}},
+            )
+            yield _sse("error", {"detail": f"Failed to save the conversation: {e}"})
+            return
+        yield _sse(
+            "done",
+            {"message": message.dict(), "time_to_first_token_ms": first_token_ms},
+        )
+
+        # Fold this exchange into the room's memory once the response has ended
+        background_tasks.add_task(
+            update_memory, model, chatroom_ref, message_req.message, ai_response
+        )
+
+    background_tasks = BackgroundTasks()
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
+
+
 @router.patch("/users/{user_id}/chatrooms/{room_id}/messages/{message_id}")
 async def update_chat_message(
     user_id: str, room_id: str, message_id: str, updates: MessageUpdate
@@ -356,15 +582,18 @@ async def update_chat_message(
     """Update a chat message (currently only for archiving/unarchiving)"""
     try:
         # Verify user, chatroom, and message
-        user_ref = db.collection("users").document(user_id)
+        user_ref = async_db.collection("users").document(user_id)
         chatroom_ref = user_ref.collection("chatrooms").document(room_id)
         message_ref = chatroom_ref.collection("messages").document(message_id)
 
-        if not user_ref.get().exists:
+        user, chatroom, message = await get_documents_async(
+            [user_ref, chatroom_ref, message_ref]
+        )
+        if not user.exists:
             raise HTTPException(status_code=404, detail="User not found")
-        if not chatroom_ref.get().exists:
+        if not chatroom.exists:
             raise HTTPException(status_code=404, detail="Chat room not found")
-        if not message_ref.get().exists:
+        if not message.exists:
             raise HTTPException(status_code=404, detail="Message not found")
 
         # Update message
@@ -373,7 +602,9 @@ async def update_chat_message(
             update_data["archived"] = updates.archived
 
         if update_data:
-            message_ref.update(update_data)
+            with observe_firestore("messages", "update"):
+                await message_ref.update(update_data)
+            forget(message_ref)
 
         return {"message": "Message updated successfully"}
     except HTTPException as e:
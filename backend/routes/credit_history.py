@@ -3,26 +3,32 @@
 from datetime import datetime
 
 from fastapi import APIRouter
-from services.firestore import db
+from services.firestore import db, forget, get_document
+from services.metrics import observe_firestore
+from services.user_cache import cached, invalidate
 
 router = APIRouter()
 
 
 # Ambil riwayat kredit user
-@router.get("/users/{user_id}/credit_history")
-def get_credit_history(user_id: str):
+def _load_credit_history(user_id: str) -> dict:
     ref = (
         db.collection("users")
         .document(user_id)
         .collection("credit_history")
         .document("main")
     )
-    doc = ref.get()
+    doc = get_document(ref)
     if doc.exists:
         return doc.to_dict()
     return {"total_loans_taken": 0, "missed_payments": 0, "has_default_history": False}
 
 
+@router.get("/users/{user_id}/credit_history")
+def get_credit_history(user_id: str):
+    return cached(user_id, "credit_history", lambda: _load_credit_history(user_id))
+
+
 # Update riwayat kredit user
 @router.patch("/users/{user_id}/credit_history")
 def update_credit_history(user_id: str, payload: dict):
@@ -34,5 +40,8 @@ def update_credit_history(user_id: str, payload: dict):
         .collection("credit_history")
         .document("main")
     )
-    ref.set(payload, merge=True)
+    with observe_firestore("credit_history", "set"):
+        ref.set(payload, merge=True)
+    forget(ref)
+    invalidate(user_id, "credit_history")
     return {"message": "Credit history updated"}
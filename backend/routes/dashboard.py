@@ -0,0 +1,132 @@
+# routes/dashboard.py
+#
+# Everything the home screen shows, in one authenticated request. The single
+# documents (profile, dependents, credit history, aggregates, latest risk
+# score) come from one get_all(); active loans and recent transactions are
+# queried alongside it on the async client. A section that fails or times out
+# is reported under "errors" instead of failing the whole response.
+
+import asyncio
+import os
+import time
+
+from auth_utils import get_current_user_uid
+from fastapi import APIRouter, Depends, HTTPException, Query
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from routes.transactions import serialize_transaction
+from services.firestore import async_db
+from services.log import get_logger
+from services.metrics import observe_firestore
+from services.snapshot import load_user_snapshot_async
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv("DASHBOARD_SECTION_TIMEOUT", "5"))
+DEFAULT_RECENT_TRANSACTIONS = 10
+
+
+def _user_ref(user_id: str):
+    return async_db.collection("users").document(user_id)
+
+
+async def _documents(user_id: str) -> dict:
+    snapshot = await load_user_snapshot_async(
+        user_id,
+        sections=("dependents", "credit_history", "aggregates", "latest_risk_score"),
+    )
+    profile = dict(snapshot.profile)
+    # Same mapping as GET /users/{user_id}
+    if "mobile" in profile:
+        profile["phone"] = profile.pop("mobile")
+    return {
+        "profile": profile,
+        "dependents": snapshot.dependents,
+        "credit_history": snapshot.credit_history,
+        "aggregates": snapshot.aggregates,
+        "risk_score": snapshot.latest_risk_score or None,
+    }
+
+
+async def _active_loans(user_id: str) -> list:
+    query = (
+        _user_ref(user_id)
+        .collection("loans")
+        .where(filter=FieldFilter("is_active", "==", True))
+    )
+    with observe_firestore("loans", "query"):
+        return [doc.to_dict() async for doc in query.stream()]
+
+
+async def _recent_transactions(user_id: str, limit: int) -> list:
+    query = (
+        _user_ref(user_id)
+        .collection("transactions")
+        .order_by("created_at", direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+    with observe_firestore("transactions", "query"):
+        return [serialize_transaction(doc) async for doc in query.stream()]
+
+
+async def _section(name: str, coro, timings: dict):
+    """Run one section; return (value, error message or None)."""
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(coro, DASHBOARD_SECTION_TIMEOUT), None
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        return None, f"Timed out after {DASHBOARD_SECTION_TIMEOUT:g}s"
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+
+@router.get("/users/{user_id}/dashboard")
+async def get_dashboard(
+    user_id: str,
+    transactions_limit: int = Query(default=DEFAULT_RECENT_TRANSACTIONS, ge=1, le=50),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
+    """Profile, active loans, recent transactions, totals, dependents, credit
+    history and the latest risk score. Sections that could not be loaded are
+    null and listed in `errors`."""
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only access your own dashboard.",
+        )
+
+    timings = {}
+    start = time.perf_counter()
+    (documents, documents_error), *rest = await asyncio.gather(
+        _section("documents", _documents(user_id), timings),
+        _section("active_loans", _active_loans(user_id), timings),
+        _section(
+            "recent_transactions",
+            _recent_transactions(user_id, transactions_limit),
+            timings,
+        ),
+    )
+    timings["total"] = (time.perf_counter() - start) * 1000
+
+    dashboard = {"user_id": user_id}
+    errors = {}
+    for name in ("profile", "dependents", "credit_history", "aggregates", "risk_score"):
+        dashboard[name] = documents[name] if documents else None
+        if documents_error:
+            errors[name] = documents_error
+    for name, (value, error) in zip(("active_loans", "recent_transactions"), rest):
+        dashboard[name] = value
+        if error:
+            errors[name] = error
+
+    if errors:
+        logger.warning(
+            "dashboard.partial",
+            extra={"fields": {"user_id": user_id, "errors": errors}},
+        )
+    return {**dashboard, "errors": errors, "timings": timings}
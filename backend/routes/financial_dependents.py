@@ -3,26 +3,32 @@
 from datetime import datetime
 
 from fastapi import APIRouter
-from services.firestore import db
+from services.firestore import db, forget, get_document
+from services.metrics import observe_firestore
+from services.user_cache import cached, invalidate
 
 router = APIRouter()
 
 
 # Ambil jumlah tanggungan user
-@router.get("/users/{user_id}/dependents")
-def get_dependents(user_id: str):
+def _load_dependents(user_id: str) -> dict:
     ref = (
         db.collection("users")
         .document(user_id)
         .collection("financial_dependents")
         .document("main")
     )
-    doc = ref.get()
+    doc = get_document(ref)
     if doc.exists:
         return doc.to_dict()
     return {"dependents_count": 0}
 
 
+@router.get("/users/{user_id}/dependents")
+def get_dependents(user_id: str):
+    return cached(user_id, "dependents", lambda: _load_dependents(user_id))
+
+
 # Update jumlah tanggungan user
 @router.patch("/users/{user_id}/dependents")
 def update_dependents(user_id: str, payload: dict):
@@ -34,5 +40,8 @@ def update_dependents(user_id: str, payload: dict):
         .collection("financial_dependents")
         .document("main")
     )
-    ref.set(payload, merge=True)
+    with observe_firestore("financial_dependents", "set"):
+        ref.set(payload, merge=True)
+    forget(ref)
+    invalidate(user_id, "dependents")
     return {"message": "Dependents updated"}
@@ -0,0 +1,27 @@
+# routes/jobs.py
+
+from auth_utils import get_current_user_uid
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from services.jobs import get_store, job_summary
+
+router = APIRouter()
+
+
+# Status of a background job started with `async=true`
+@router.get("/users/{user_id}/jobs/{job_id}")
+async def get_job(
+    user_id: str,
+    job_id: str,
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only access your own jobs.",
+        )
+    job = await run_in_threadpool(get_store().get, job_id)
+    # Another user's job looks the same as a missing one
+    if job is None or job["user_id"] != authenticated_user_uid:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_summary(job)
@@ -3,16 +3,26 @@
 from datetime import datetime
 
 from fastapi import APIRouter, HTTPException
+from google.cloud import firestore
+from services.aggregates import apply_delta, loan_delta
 from services.firestore import db
+from services.log import get_logger
+from services.metrics import observe_firestore
+from services.user_cache import cached, invalidate
 
 router = APIRouter()
+logger = get_logger(__name__)
+
+
+def _load_loans(user_id: str) -> list:
+    ref = db.collection("users").document(user_id).collection("loans")
+    with observe_firestore("loans", "query"):
+        return [doc.to_dict() for doc in ref.stream()]
 
 
 @router.get("/users/{user_id}/loans")
 def get_loans(user_id: str):
-    ref = db.collection("users").document(user_id).collection("loans")
-    docs = ref.stream()
-    return [doc.to_dict() for doc in docs]
+    return cached(user_id, "loans", lambda: _load_loans(user_id))
 
 
 @router.post("/users/{user_id}/loans")
@@ -26,7 +36,13 @@ def add_active_loan(user_id: str, payload: dict):
     ref = db.collection("users").document(user_id).collection("loans")
     doc = ref.document()
     payload["id"] = doc.id  # ✅ simpan doc ID ke dalam field "id"
-    doc.set(payload)
+
+    batch = db.batch()
+    batch.set(doc, payload)
+    apply_delta(batch, user_id, loan_delta(None, payload), "loans_version")
+    with observe_firestore("loans", "commit"):
+        batch.commit()
+    invalidate(user_id, "loans")
     return {"message": "Loan added", "id": doc.id}
 
 
@@ -40,7 +56,18 @@ def update_loan_payment(user_id: str, loan_id: str, payload: dict):
     payload["updated_at"] = datetime.utcnow()
 
     ref = db.collection("users").document(user_id).collection("loans").document(loan_id)
-    ref.set(payload, merge=True)
+
+    @firestore.transactional
+    def apply_update(transaction):
+        snapshot = ref.get(transaction=transaction)
+        old = snapshot.to_dict() if snapshot.exists else None
+        new = {**(old or {}), **payload}
+        transaction.set(ref, payload, merge=True)
+        apply_delta(transaction, user_id, loan_delta(old, new), "loans_version")
+
+    with observe_firestore("loans", "transaction"):
+        apply_update(db.transaction())
+    invalidate(user_id, "loans")
 
     return {"message": "Loan updated", "is_active": is_active}
 
@@ -48,8 +75,9 @@ def update_loan_payment(user_id: str, loan_id: str, payload: dict):
 @router.get("/users/{user_id}/loans/active")
 def get_active_loans(user_id: str):
     ref = db.collection("users").document(user_id).collection("loans")
-    docs = ref.where("is_active", "==", True).stream()
-    return [doc.to_dict() for doc in docs]
+    with observe_firestore("loans", "query"):
+        docs = ref.where("is_active", "==", True).stream()
+        return [doc.to_dict() for doc in docs]
 
 
 @router.delete("/users/{user_id}/loans/{loan_id}")
@@ -58,10 +86,21 @@ def delete_loan(user_id: str, loan_id: str):
         db.collection("users").document(user_id).collection("loans").document(loan_id)
     )
 
-    print(f"Deleting loan with ID: {loan_id} for user: {user_id}")
-
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Loan not found")
+    logger.info(
+        "loans.delete", extra={"fields": {"user_id": user_id, "loan_id": loan_id}}
+    )
 
-    doc_ref.delete()
+    @firestore.transactional
+    def apply_delete(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            raise HTTPException(status_code=404, detail="Loan not found")
+        transaction.delete(doc_ref)
+        apply_delta(
+            transaction, user_id, loan_delta(snapshot.to_dict(), None), "loans_version"
+        )
+
+    with observe_firestore("loans", "transaction"):
+        apply_delete(db.transaction())
+    invalidate(user_id, "loans")
     return {"message": "Loan deleted"}
@@ -1,134 +1,173 @@
-import os
 from datetime import datetime
 
-import google.generativeai as genai
-from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException
+from auth_utils import get_current_user_uid
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from google.cloud import firestore
+from services import jobs
+from services.admission import flights, rate_limit
+from services.clients import get_gemini_model
 from services.firestore import db
+from services.llm_cache import generate_cached
+from services.log import get_logger
+from services.metrics import observe_firestore
+from services.risk_engine import RiskAssessment, assess, extract_features
+from services.risk_scores import input_fingerprint, is_current, record_score
+from services.snapshot import load_user_snapshot
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.0-flash")
 router = APIRouter()
-
-
-def get_user_profile(user_id: str) -> dict:
-    doc = db.collection("users").document(user_id).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="User not found")
-    return doc.to_dict()
-
-
-def get_user_loans(user_id: str) -> list:
-    return [
-        doc.to_dict()
-        for doc in db.collection("users").document(user_id).collection("loans").stream()
-    ]
-
-
-def get_user_assets(user_id: str) -> list:
-    return [
-        doc.to_dict()
-        for doc in db.collection("users")
-        .document(user_id)
-        .collection("assets")
-        .stream()
-    ]
-
-
-def get_user_transactions(user_id: str) -> list:
-    return [
-        doc.to_dict()
-        for doc in db.collection("users")
-        .document(user_id)
-        .collection("transactions")
-        .stream()
-    ]
-
-
-@router.post("/users/{user_id}/risk_scores/generate")
-def generate_risk_score(user_id: str):
-    try:
-        profile = get_user_profile(user_id)
-        loans = get_user_loans(user_id)
-        transactions = get_user_transactions(user_id)
-        assets = get_user_assets(user_id)
-
-        expense = sum(
-            t.get("amount", 0) for t in transactions if t.get("type") == "expense"
+logger = get_logger(__name__)
+
+
+def generate_ai_explanation(
+    model, profile: dict, assessment: RiskAssessment, totals: dict
+) -> str:
+    """Ask Gemini to explain an already computed risk level in 1-2 sentences."""
+    features = ", ".join(f"{k}={v:.2f}" for k, v in assessment.features.items())
+    prompt = f"""
+    User Profile:
+    - Profile : {profile}
+    - Income: Rp{totals["total_income"]}
+    - Expenses: Rp{totals["total_expense"]}
+    - Total Monthly Installments: Rp{totals["total_cicilan_perbulan"]}
+    - Remaining Total Debt: Rp{totals["total_utang"]}
+    - Risk features: {features}
+
+    This user's financial risk has been scored as {assessment.risk_level}
+    (probability {assessment.probability:.2f}).
+    Give a brief 1-2 sentence explanation why, without repeating the risk level.
+    """
+
+    return generate_cached(model, prompt).strip()
+
+
+SCORE_SECTIONS = ("dependents", "credit_history", "aggregates", "latest_risk_score")
+
+
+def _fingerprint(snapshot) -> str:
+    return input_fingerprint(
+        snapshot.profile,
+        snapshot.aggregates,
+        snapshot.dependents,
+        snapshot.credit_history,
+    )
+
+
+def _score_response(score: dict, cached: bool) -> dict:
+    return {
+        "risk_level": score["score"],
+        "explanation": score["explanation"],
+        "probability": score["probability"],
+        "confident": score.get("confident", True),
+        "cached": cached,
+    }
+
+
+@router.get("/users/{user_id}/risk_scores/latest")
+def get_latest_risk_score(
+    user_id: str, authenticated_user_uid: str = Depends(get_current_user_uid)
+):
+    """The last stored score; `stale` is true once its inputs have changed."""
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only access your own risk scores.",
         )
-        income = sum(
-            t.get("amount", 0) for t in transactions if t.get("type") == "income"
+    snapshot = load_user_snapshot(user_id, sections=SCORE_SECTIONS)
+    latest = snapshot.latest_risk_score
+    if not latest:
+        raise HTTPException(status_code=404, detail="Risk score not calculated yet")
+    return {**latest, "stale": latest.get("fingerprint") != _fingerprint(snapshot)}
+
+
+@router.get("/users/{user_id}/risk_scores")
+def get_risk_score_history(
+    user_id: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only access your own risk scores.",
         )
+    query = (
+        db.collection("users")
+        .document(user_id)
+        .collection("risk_scores")
+        .order_by("last_calculated", direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+    with observe_firestore("risk_scores", "query"):
+        return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
 
-        total_cicilan_perbulan = sum(loan.get("cicilanPerbulan", 0) for loan in loans)
 
-        total_utang = sum(
-            loan.get("cicilanPerbulan", 0)
-            * (loan.get("cicilanTotalBulan", 0) - loan.get("cicilanSudahDibayar", 0))
-            for loan in loans
+def _generate_risk_score(user_id: str, explain: bool, force: bool, model) -> dict:
+    try:
+        snapshot = load_user_snapshot(user_id, sections=SCORE_SECTIONS)
+        profile = snapshot.profile
+        aggregates = snapshot.aggregates
+
+        fingerprint = _fingerprint(snapshot)
+        if not force and is_current(snapshot.latest_risk_score, fingerprint, explain):
+            logger.info(
+                "risk_score.reused",
+                extra={"fields": {"user_id": user_id, "snapshot_ms": snapshot.timings}},
+            )
+            return _score_response(snapshot.latest_risk_score, cached=True)
+
+        features = extract_features(
+            aggregates, snapshot.dependents, snapshot.credit_history
         )
-
-        print("Profile:", profile)
-        print("Assets:", assets)
-        print("Transactions:", transactions)
-        print("Loans:", loans)
-        print("Total Income:", income)
-        print("Total Expense:", expense)
-        print("Total Installments:", total_cicilan_perbulan)
-        print("Total Debt:", total_utang)
-
-        # Prompt AI
-        prompt = f"""
-        User Profile:
-        - Profile : {profile}
-        - Assets: {assets}
-        - Income: Rp{income}
-        - Expenses: Rp{expense}
-        - Total Monthly Installments: Rp{total_cicilan_perbulan}
-        - Remaining Total Debt: Rp{total_utang}
-
-        Your task is to categorize this user's financial risk into one of the following:
-        - Low
-        - Medium    
-        - High
-
-        Then give a brief 1-2 sentence explanation why.
-        Format: <Risk>: <Reason>
-        Example: High: Expenses exceed income.
-        """
-
-        ai_response = model.generate_content(prompt)
-        reply = ai_response.text.strip()
-
-        risk_level = "Unknown"
-        explanation = reply
-
-        if ":" in reply:
-            level_part, explanation_part = reply.split(":", 1)
-            explanation = explanation_part.strip()
-
-            level_lower = level_part.strip().lower()
-            if "high" in level_lower or "tinggi" in level_lower:
-                risk_level = "High"
-            elif "medium" in level_lower or "sedang" in level_lower:
-                risk_level = "Medium"
-            elif "low" in level_lower or "rendah" in level_lower:
-                risk_level = "Low"
+        assessment = assess(features)
+
+        explanation = assessment.explanation
+        generated_by_ai = False
+        if explain or not assessment.confident:
+            try:
+                explanation = generate_ai_explanation(
+                    model, profile, assessment, aggregates
+                )
+                generated_by_ai = True
+            except Exception as e:
+                # The local explanation is still valid; don't fail the score
+                logger.warning(
+                    "risk_score.ai_explanation_failed",
+                    extra={"fields": {"user_id": user_id, "error": str(e)}},
+                )
 
         # Simpan hasil ke Firestore
-        db.collection("users").document(user_id).collection(
-            "risk_scores"
-        ).document().set(
-            {
-                "score": risk_level,
-                "generated_by_ai": True,
-                "explanation": explanation,
-                "last_calculated": datetime.utcnow(),
-            }
+        score = {
+            "score": assessment.risk_level,
+            "probability": assessment.probability,
+            "confident": assessment.confident,
+            "features": assessment.features,
+            "engine_version": assessment.engine_version,
+            "generated_by_ai": generated_by_ai,
+            "explanation": explanation,
+            "last_calculated": datetime.utcnow(),
+        }
+        batch = db.batch()
+        record_score(batch, user_id, score, fingerprint)
+        with observe_firestore("risk_scores", "commit"):
+            batch.commit()
+
+        logger.info(
+            "risk_score.generated",
+            extra={
+                "fields": {
+                    "user_id": user_id,
+                    "risk_level": assessment.risk_level,
+                    "probability": assessment.probability,
+                    "generated_by_ai": generated_by_ai,
+                    "snapshot_ms": snapshot.timings,
+                }
+            },
         )
 
-        return {"risk_level": risk_level, "explanation": explanation}
+        return _score_response(score, cached=False)
 
     except HTTPException as http_err:
         raise http_err
@@ -136,3 +175,63 @@ def generate_risk_score(user_id: str):
         raise HTTPException(
             status_code=500, detail=f"Failed to generate risk score: {str(e)}"
         )
+
+
+@jobs.handler("risk_score")
+def _run_risk_score_job(payload: dict) -> dict:
+    try:
+        return _generate_risk_score(
+            payload["user_id"], payload["explain"], payload["force"], get_gemini_model()
+        )
+    except HTTPException as e:
+        # A missing user won't appear on retry; a 500 might be transient
+        if e.status_code < 500:
+            raise jobs.JobFailed(e.detail)
+        raise RuntimeError(e.detail)
+
+
+@router.post(
+    "/users/{user_id}/risk_scores/generate",
+    dependencies=[Depends(rate_limit("risk"))],
+)
+async def generate_risk_score(
+    user_id: str,
+    explain: bool = False,
+    force: bool = False,
+    run_async: bool = Query(default=False, alias="async"),
+    model=Depends(get_gemini_model),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
+    """Score the user locally; Gemini only writes the explanation when asked
+    (`explain=true`) or when the score sits close to a level boundary.
+
+    The stored score is returned as is while its inputs are unchanged, unless
+    `force=true`. Concurrent identical requests share one computation.
+
+    With `async=true` the score is computed by a background worker: the
+    response is 202 with the job, to poll at GET /users/{user_id}/jobs/{id}."""
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only generate your own risk score.",
+        )
+    if run_async:
+        job, _ = await run_in_threadpool(
+            jobs.submit,
+            "risk_score",
+            {"user_id": user_id, "explain": explain, "force": force},
+            user_id,
+            f"risk_score:{user_id}:{explain}:{force}",
+        )
+        status_url = f"/users/{user_id}/jobs/{job['id']}"
+        return JSONResponse(
+            status_code=202,
+            content=jsonable_encoder({**jobs.job_summary(job), "status_url": status_url}),
+            headers={"Location": status_url},
+        )
+
+    return await flights.do(
+        ("risk", user_id, explain, force),
+        lambda: run_in_threadpool(_generate_risk_score, user_id, explain, force, model),
+        scope="risk",
+    )
@@ -1,13 +1,22 @@
 # routes/transactions.py
 
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 from auth_utils import get_current_user_uid
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
-from pydantic import BaseModel, Field
-from services.firestore import db
+from pydantic import BaseModel, Field, ValidationError
+from services.aggregates import apply_delta, merge_deltas, transaction_delta
+from services.firestore import db, get_document
+from services.metrics import observe_firestore
 
 router = APIRouter()
 
@@ -20,10 +29,56 @@ class TransactionPayload(BaseModel):
     created_at: datetime  # Expect a datetime object (FastAPI/Pydantic handle ISO string parsing)
 
 
-# Get all user transactions - now protected
+EXPORT_CSV_COLUMNS = ["id", "created_at", "type", "category", "amount", "note"]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Firestore caps a batch at 500 writes; one of them is the aggregates update
+BULK_BATCH_SIZE = 499
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "10000"))
+_bulk_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BULK_COMMIT_WORKERS", "4")),
+    thread_name_prefix="bulk-commit",
+)
+
+
+def _to_utc(value: datetime) -> datetime:
+    # Firestore prefers timezone-aware datetime objects
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def serialize_transaction(doc) -> dict:
+    data = doc.to_dict()
+    data["id"] = doc.id  # Explicitly add the document ID
+
+    # Format timestamp to ISO string if it's a datetime object
+    if "created_at" in data and isinstance(data["created_at"], datetime):
+        data["created_at"] = (
+            _to_utc(data["created_at"]).isoformat().replace("+00:00", "Z")
+        )  # Use ISO format with Z
+
+    return data
+
+
+# Get user transactions - now protected
+# Without `limit`/`start_after` the full list is returned (legacy behaviour);
+# with either, a page is returned as {"transactions": [...], "next_cursor": ...}.
 @router.get("/users/{user_id}/transactions")
 def get_transactions(
-    user_id: str, authenticated_user_uid: str = Depends(get_current_user_uid)
+    user_id: str,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    start_after: str | None = Query(
+        default=None, description="next_cursor from the previous page"
+    ),
+    from_date: datetime | None = Query(default=None, alias="from"),
+    to_date: datetime | None = Query(default=None, alias="to"),
+    fields: str | None = Query(
+        default=None, description="Comma-separated fields to return, e.g. amount,type"
+    ),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
 ):
     if user_id != authenticated_user_uid:
         raise HTTPException(
@@ -33,33 +88,98 @@ def get_transactions(
 
     user_doc_ref = db.collection("users").document(user_id)
     # Optional: Check if user exists first
-    if not user_doc_ref.get().exists:
+    if not get_document(user_doc_ref).exists:
         raise HTTPException(status_code=404, detail="User not found")
 
     trans_ref = user_doc_ref.collection("transactions")
-    docs = trans_ref.order_by(
-        "created_at", direction=firestore.Query.DESCENDING
-    ).stream()
+    query = trans_ref.order_by("created_at", direction=firestore.Query.DESCENDING)
+
+    if from_date is not None:
+        query = query.where(filter=FieldFilter("created_at", ">=", _to_utc(from_date)))
+    if to_date is not None:
+        query = query.where(filter=FieldFilter("created_at", "<", _to_utc(to_date)))
+    if fields:
+        query = query.select([f.strip() for f in fields.split(",") if f.strip()])
+
+    paginated = limit is not None or start_after is not None
+    if not paginated:
+        with observe_firestore("transactions", "query"):
+            return [serialize_transaction(doc) for doc in query.stream()]
+
+    if start_after:
+        cursor_doc = get_document(trans_ref.document(start_after))
+        if not cursor_doc.exists:
+            raise HTTPException(status_code=400, detail="Invalid start_after cursor")
+        query = query.start_after(cursor_doc)
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    # Fetch one extra document to know whether another page exists
+    with observe_firestore("transactions", "query"):
+        docs = list(query.limit(page_size + 1).stream())
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+
+    return {
+        "transactions": [serialize_transaction(doc) for doc in docs],
+        "next_cursor": docs[-1].id if has_more else None,
+    }
 
-    transactions_list = []
+
+def _export_ndjson(docs):
     for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id  # Explicitly add the document ID
+        yield json.dumps(serialize_transaction(doc), default=str) + "\n"
+
+
+def _export_csv(docs):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_COLUMNS, extrasaction="ignore")
 
-        # Format timestamp to ISO string if it's a datetime object
-        if "created_at" in data and isinstance(data["created_at"], datetime):
-            # Ensure timestamp is timezone-aware (UTC) before formatting
-            if data["created_at"].tzinfo is None:
-                timestamp_utc = data["created_at"].replace(tzinfo=timezone.utc)
-            else:
-                timestamp_utc = data["created_at"].astimezone(timezone.utc)
-            data["created_at"] = timestamp_utc.isoformat().replace(
-                "+00:00", "Z"
-            )  # Use ISO format with Z
+    def flush():
+        row = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return row
+
+    writer.writeheader()
+    yield flush()
+    for doc in docs:
+        writer.writerow(serialize_transaction(doc))
+        yield flush()
+
+
+# Export the full transaction history - now protected
+# Rows are streamed as Firestore returns them, so memory stays flat.
+@router.get("/users/{user_id}/transactions/export")
+def export_transactions(
+    user_id: str,
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only export your own transactions.",
+        )
+
+    user_doc_ref = db.collection("users").document(user_id)
+    if not get_document(user_doc_ref).exists:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        transactions_list.append(data)
+    docs = (
+        user_doc_ref.collection("transactions")
+        .order_by("created_at", direction=firestore.Query.DESCENDING)
+        .stream()
+    )
 
-    return transactions_list
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(docs),
+            media_type="text/csv",
+            headers={
+                "Content-Disposition": f'attachment; filename="transactions-{user_id}.csv"'
+            },
+        )
+    return StreamingResponse(_export_ndjson(docs), media_type="application/x-ndjson")
 
 
 # Tambahkan transaksi baru - now protected
@@ -77,7 +197,7 @@ def add_transaction(
 
     # Ensure user exists before adding transaction
     user_doc_ref = db.collection("users").document(user_id)
-    if not user_doc_ref.get().exists:
+    if not get_document(user_doc_ref).exists:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Convert Pydantic model back to dict for Firestore
@@ -85,17 +205,126 @@ def add_transaction(
     transaction_data = payload.dict()
 
     # Ensure the datetime is timezone-aware (UTC) before saving
-    # Firestore prefers timezone-aware datetime objects
-    if transaction_data["created_at"].tzinfo is None:
-        transaction_data["created_at"] = transaction_data["created_at"].replace(
-            tzinfo=timezone.utc
-        )
-    else:
-        transaction_data["created_at"] = transaction_data["created_at"].astimezone(
-            timezone.utc
-        )
+    transaction_data["created_at"] = _to_utc(transaction_data["created_at"])
 
     ref = user_doc_ref.collection("transactions")
     doc_ref = ref.document()  # auto-generate ID
-    doc_ref.set(transaction_data)
+
+    # Write the transaction and bump the user's aggregates atomically
+    batch = db.batch()
+    batch.set(doc_ref, transaction_data)
+    apply_delta(
+        batch, user_id, transaction_delta(transaction_data), "transactions_version"
+    )
+    with observe_firestore("transactions", "commit"):
+        batch.commit()
     return {"message": "Transaction added", "id": doc_ref.id}
+
+
+def _parse_bulk_rows(body: bytes, content_type: str) -> list:
+    if content_type.startswith("text/csv"):
+        reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+        # Empty CSV cells mean "not provided", e.g. an optional note
+        return [{k: v for k, v in row.items() if v != ""} for row in reader]
+
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get("transactions")
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of transactions")
+    return data
+
+
+def _commit_chunk(user_id: str, chunk: list) -> None:
+    # The chunk's rows and its share of the aggregates commit together
+    batch = db.batch()
+    for doc_ref, transaction_data in chunk:
+        batch.set(doc_ref, transaction_data)
+    delta = merge_deltas(*(transaction_delta(data) for _, data in chunk))
+    apply_delta(batch, user_id, delta, "transactions_version")
+    with observe_firestore("transactions", "commit"):
+        batch.commit()
+
+
+def _bulk_insert(user_id: str, rows: list) -> dict:
+    user_doc_ref = db.collection("users").document(user_id)
+    if not get_document(user_doc_ref).exists:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Validate everything up front; invalid rows are reported, not written
+    errors = []
+    pending = []  # (row index, doc ref, transaction data)
+    trans_ref = user_doc_ref.collection("transactions")
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Row must be an object")
+            if None in row:
+                # csv.DictReader files cells beyond the header under None
+                raise ValueError("Row has more columns than the header")
+            transaction_data = TransactionPayload(**row).dict()
+        except (ValidationError, ValueError) as e:
+            errors.append({"row": index, "error": str(e)})
+            continue
+        transaction_data["created_at"] = _to_utc(transaction_data["created_at"])
+        pending.append((index, trans_ref.document(), transaction_data))
+
+    chunks = [
+        pending[i : i + BULK_BATCH_SIZE] for i in range(0, len(pending), BULK_BATCH_SIZE)
+    ]
+    futures = [
+        _bulk_executor.submit(
+            _commit_chunk, user_id, [(ref, data) for _, ref, data in chunk]
+        )
+        for chunk in chunks
+    ]
+
+    inserted = []
+    for chunk, future in zip(chunks, futures):
+        try:
+            future.result()
+        except Exception as e:
+            errors.extend(
+                {"row": index, "error": f"Commit failed: {e}"} for index, _, _ in chunk
+            )
+            continue
+        inserted.extend(chunk)
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "message": f"{len(inserted)} of {len(rows)} transactions added",
+        "inserted": len(inserted),
+        "failed": len(errors),
+        "ids": [ref.id for _, ref, _ in sorted(inserted, key=lambda p: p[0])],
+        "errors": errors,
+    }
+
+
+# Tambahkan banyak transaksi sekaligus - now protected
+# Body: JSON list of transactions, {"transactions": [...]}, or a text/csv
+# upload with amount,category,type,created_at[,note] columns.
+@router.post("/users/{user_id}/transactions/bulk")
+async def add_transactions_bulk(
+    user_id: str,
+    request: Request,
+    authenticated_user_uid: str = Depends(get_current_user_uid),
+):
+    if user_id != authenticated_user_uid:
+        raise HTTPException(
+            status_code=403,
+            detail="Forbidden: You can only add transactions for yourself.",
+        )
+
+    body = await request.body()
+    try:
+        rows = _parse_bulk_rows(body, request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk payload: {e}")
+
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many transactions: at most {BULK_MAX_ROWS} per request.",
+        )
+
+    return await run_in_threadpool(_bulk_insert, user_id, rows)
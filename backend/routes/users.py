@@ -1,10 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends
-from services.firestore import db
+from services.firestore import db, forget, get_document
+from services.metrics import observe_firestore
+from services.user_cache import cached, invalidate
 from auth_utils import get_current_user_uid
 
 router = APIRouter()
 
 
+def _load_profile(user_id: str):
+    doc = get_document(db.collection("users").document(user_id))
+    return doc.to_dict() if doc.exists else None
+
+
 # Get user profile by ID - now protected
 @router.get("/users/{user_id}")
 def get_user_profile(user_id: str, authenticated_user_uid: str = Depends(get_current_user_uid)):
@@ -12,13 +19,10 @@ def get_user_profile(user_id: str, authenticated_user_uid: str = Depends(get_cur
     if user_id != authenticated_user_uid:
         raise HTTPException(status_code=403, detail="Forbidden: You can only access your own profile.")
 
-    doc_ref = db.collection("users").document(user_id)
-    doc = doc_ref.get()
-    if not doc.exists:
+    data = cached(user_id, "profile", lambda: _load_profile(user_id))
+    if data is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    data = doc.to_dict()
-    
     # Map 'mobile' from Firestore to 'phone' for the API response
     if 'mobile' in data:
         data['phone'] = data.pop('mobile') # Rename mobile to phone
@@ -35,7 +39,10 @@ def get_user_profile(user_id: str, authenticated_user_uid: str = Depends(get_cur
 @router.post("/users/{user_id}")
 def create_user(user_id: str, payload: dict):
     ref = db.collection("users").document(user_id)
-    ref.set(payload)
+    with observe_firestore("users", "set"):
+        ref.set(payload)
+    forget(ref)
+    invalidate(user_id, "profile")
     return {"message": f"User {user_id} created."}
 
 
@@ -51,9 +58,12 @@ def update_user_profile(user_id: str, payload: dict, authenticated_user_uid: str
         
     ref = db.collection("users").document(user_id)
     # Check if document exists before updating
-    if not ref.get().exists:
+    if not get_document(ref).exists:
         raise HTTPException(status_code=404, detail="User not found, cannot update.")
-    ref.update(payload) # Use update to avoid overwriting fields not included in payload
+    with observe_firestore("users", "update"):
+        ref.update(payload) # Use update to avoid overwriting fields not included in payload
+    forget(ref)
+    invalidate(user_id, "profile")
     return {"message": f"User {user_id} updated."}
 
 
@@ -65,7 +75,10 @@ def delete_user(user_id: str, authenticated_user_uid: str = Depends(get_current_
 
     # Check if document exists before deleting
     doc_ref = db.collection("users").document(user_id)
-    if not doc_ref.get().exists:
+    if not get_document(doc_ref).exists:
         raise HTTPException(status_code=404, detail="User not found, cannot delete.")
-    doc_ref.delete()
+    with observe_firestore("users", "delete"):
+        doc_ref.delete()
+    forget(doc_ref)
+    invalidate(user_id)
     return {"message": f"User {user_id} deleted."}
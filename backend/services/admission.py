@@ -0,0 +1,135 @@
+# services/admission.py
+#
+# Admission control for the LLM-backed routes (risk generation, chat).
+#
+# Per-user token buckets: each user gets ADMISSION_BURST requests at once and
+# then ADMISSION_RATE_PER_MINUTE more per minute, separately per scope. A
+# request over the limit gets 429 with Retry-After instead of queueing behind
+# Gemini. Buckets are keyed on the verified uid from the ID token, never on the
+# path, so one caller cannot spend another user's budget.
+#
+# Single-flight: concurrent identical requests (a double-tapped "generate",
+# the same message sent from two tabs) share one in-flight computation and
+# all receive its result, or its exception.
+#
+# ADMISSION_RATE_PER_MINUTE  tokens refilled per minute per user; 0 disables
+# ADMISSION_BURST            bucket size
+# ADMISSION_MAX_USERS        buckets kept per scope (least recently used go)
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from auth_utils import get_current_user_uid
+from fastapi import Depends, HTTPException
+from services.metrics import admission_decisions
+
+ADMISSION_RATE_PER_MINUTE = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "20"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "5"))
+ADMISSION_MAX_USERS = int(os.getenv("ADMISSION_MAX_USERS", "10000"))
+
+
+class TokenBucketLimiter:
+    """One token bucket per key; `acquire` returns 0 or the seconds to wait."""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: int,
+        max_keys: int = ADMISSION_MAX_USERS,
+        clock=time.monotonic,
+    ):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, key: str) -> float:
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # An evicted bucket comes back full, so only idle users should go
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SingleFlight:
+    """Share one running coroutine between concurrent callers with the same key.
+
+    The computation runs as its own task, so a caller that disconnects does
+    not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key, fn, scope: str = "default"):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            admission_decisions.inc(scope=scope, outcome="coalesced")
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+_limiters = {}
+flights = SingleFlight()
+
+
+def limiter_for(scope: str) -> TokenBucketLimiter:
+    if scope not in _limiters:
+        _limiters[scope] = TokenBucketLimiter(
+            ADMISSION_RATE_PER_MINUTE / 60, ADMISSION_BURST
+        )
+    return _limiters[scope]
+
+
+def rate_limit(scope: str):
+    """FastAPI dependency limiting each authenticated user to the scope's bucket."""
+    limiter = limiter_for(scope)
+
+    async def admit(uid: str = Depends(get_current_user_uid)) -> None:
+        wait = limiter.acquire(uid)
+        if wait:
+            admission_decisions.inc(scope=scope, outcome="rejected")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+        admission_decisions.inc(scope=scope, outcome="admitted")
+
+    return admit
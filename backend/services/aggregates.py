@@ -0,0 +1,253 @@
+# services/aggregates.py
+#
+# Materialised per-user totals kept in users/{user_id}/aggregates/main.
+# Write paths apply deltas in the same batch/transaction as the document they
+# change, so the risk and chat paths can read one document instead of
+# re-streaming the whole transaction and loan history.
+#
+# Legacy users without the doc get it rebuilt from their history on first read.
+# A rebuild only commits if no delta landed while the history was read (every
+# write bumps a version counter), and starts over otherwise.
+#
+# Rebuild from scratch when the totals drift:
+#   python -m services.aggregates <user_id> [<user_id> ...]
+#   python -m services.aggregates --all
+
+import argparse
+import asyncio
+from datetime import datetime
+
+from google.cloud import firestore
+from services.firestore import (
+    async_db,
+    db,
+    forget,
+    get_document,
+    get_document_async,
+)
+from services.log import get_logger
+from services.metrics import observe_firestore
+
+logger = get_logger(__name__)
+
+TOTAL_FIELDS = (
+    "total_income",
+    "total_expense",
+    "total_cicilan_perbulan",
+    "total_utang",
+    "transaction_count",
+    "loan_count",
+    "total_assets",
+)
+
+EMPTY_AGGREGATES = {field: 0 for field in TOTAL_FIELDS}
+
+# Bumped by every write (and by rebuilds), so derived data can tell it is stale
+VERSION_FIELDS = ("transactions_version", "loans_version", "assets_version")
+
+
+def aggregates_ref(user_id: str, client=None):
+    return (
+        (client or db)
+        .collection("users")
+        .document(user_id)
+        .collection("aggregates")
+        .document("main")
+    )
+
+
+def transaction_delta(transaction: dict, sign: int = 1) -> dict:
+    amount = transaction.get("amount", 0) * sign
+    delta = {"transaction_count": sign}
+    if transaction.get("type") == "income":
+        delta["total_income"] = amount
+    elif transaction.get("type") == "expense":
+        delta["total_expense"] = amount
+    return delta
+
+
+def loan_totals(loan: dict) -> tuple:
+    """Return (monthly installment, remaining debt) contributed by one loan."""
+    cicilan = loan.get("cicilanPerbulan", 0)
+    remaining_months = loan.get("cicilanTotalBulan", 0) - loan.get(
+        "cicilanSudahDibayar", 0
+    )
+    return cicilan, cicilan * remaining_months
+
+
+def loan_delta(old: dict | None, new: dict | None) -> dict:
+    old_cicilan, old_utang = loan_totals(old) if old else (0, 0)
+    new_cicilan, new_utang = loan_totals(new) if new else (0, 0)
+    return {
+        "total_cicilan_perbulan": new_cicilan - old_cicilan,
+        "total_utang": new_utang - old_utang,
+        "loan_count": (new is not None) - (old is not None),
+    }
+
+
+def asset_value(asset: dict) -> float:
+    """Value of one saved asset: the sum of its sale prices, or a plain value."""
+    prices = asset.get("hargaJual")
+    if isinstance(prices, list):
+        return sum(p for p in prices if isinstance(p, (int, float)))
+    return asset.get("value", 0)
+
+
+def merge_deltas(*deltas: dict) -> dict:
+    merged = {}
+    for delta in deltas:
+        for field, value in delta.items():
+            merged[field] = merged.get(field, 0) + value
+    return merged
+
+
+def apply_delta(writer, user_id: str, delta: dict, version_field: str) -> None:
+    """Queue an increment of the aggregates doc on a batch or transaction."""
+    update = {
+        field: firestore.Increment(value) for field, value in delta.items() if value
+    }
+    update[version_field] = firestore.Increment(1)
+    update["updated_at"] = datetime.utcnow()
+    writer.set(aggregates_ref(user_id), update, merge=True)
+
+
+def set_asset_totals(writer, user_id: str, assets: list) -> None:
+    """Queue the asset total on a batch; asset saves replace the whole portfolio."""
+    writer.set(
+        aggregates_ref(user_id),
+        {
+            "total_assets": sum(asset_value(a) for a in assets),
+            "assets_version": firestore.Increment(1),
+            "updated_at": datetime.utcnow(),
+        },
+        merge=True,
+    )
+
+
+def compute_aggregates(transactions, loans, assets) -> dict:
+    totals = dict(EMPTY_AGGREGATES)
+    for t in transactions:
+        totals = merge_deltas(totals, transaction_delta(t))
+    for loan in loans:
+        totals = merge_deltas(totals, loan_delta(None, loan))
+    totals["total_assets"] = sum(asset_value(a) for a in assets)
+    return totals
+
+
+REBUILD_ATTEMPTS = 5
+
+
+def _versions(snapshot):
+    """The version counters of an aggregates snapshot, or None if it is missing."""
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict()
+    return {field: data.get(field, 0) for field in VERSION_FIELDS}
+
+
+@firestore.transactional
+def _overwrite_if_unchanged(transaction, ref, versions, data: dict) -> bool:
+    if _versions(ref.get(transaction=transaction)) != versions:
+        return False
+    transaction.set(ref, data)
+    return True
+
+
+def rebuild_aggregates(user_id: str) -> dict:
+    """Recompute the aggregates doc from the full history and overwrite it.
+
+    If the history changed while it was read, the rebuild starts over; after
+    REBUILD_ATTEMPTS the last totals are returned without being stored.
+    """
+    user_ref = db.collection("users").document(user_id)
+    ref = aggregates_ref(user_id)
+    for _ in range(REBUILD_ATTEMPTS):
+        forget(ref)
+        versions = _versions(get_document(ref))
+        transactions = (
+            doc.to_dict()
+            for doc in user_ref.collection("transactions")
+            .select(["amount", "type"])
+            .stream()
+        )
+        loans = (doc.to_dict() for doc in user_ref.collection("loans").stream())
+        assets = (doc.to_dict() for doc in user_ref.collection("assets").stream())
+
+        with observe_firestore("aggregates", "rebuild"):
+            totals = compute_aggregates(transactions, loans, assets)
+        data = {
+            **totals,
+            # Keep version counters monotonic so cached derivatives notice the rebuild.
+            **{
+                field: (versions or {}).get(field, -1) + 1
+                for field in VERSION_FIELDS
+            },
+            "initialized": True,
+            "rebuilt_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        with observe_firestore("aggregates", "transaction"):
+            stored = _overwrite_if_unchanged(db.transaction(), ref, versions, data)
+        forget(ref)
+        if stored:
+            return data
+
+    logger.warning(
+        "aggregates.rebuild_conflict",
+        extra={"fields": {"user_id": user_id, "attempts": REBUILD_ATTEMPTS}},
+    )
+    return data
+
+
+def aggregates_from_snapshot(user_id: str, doc) -> dict:
+    """Aggregates from an already fetched doc, rebuilding it for legacy users."""
+    if doc.exists:
+        data = doc.to_dict()
+        if data.get("initialized"):
+            return {**EMPTY_AGGREGATES, **data}
+    return rebuild_aggregates(user_id)
+
+
+async def aggregates_from_snapshot_async(user_id: str, doc) -> dict:
+    """aggregates_from_snapshot() for event-loop callers; a rebuild runs in a thread."""
+    if doc.exists and doc.to_dict().get("initialized"):
+        return {**EMPTY_AGGREGATES, **doc.to_dict()}
+    return await asyncio.to_thread(rebuild_aggregates, user_id)
+
+
+def get_aggregates(user_id: str) -> dict:
+    """Read the aggregates doc, building it on first use for legacy users."""
+    return aggregates_from_snapshot(user_id, get_document(aggregates_ref(user_id)))
+
+
+async def get_aggregates_async(user_id: str) -> dict:
+    """Async read for event-loop callers; a legacy rebuild runs in a thread."""
+    doc = await get_document_async(aggregates_ref(user_id, client=async_db))
+    return await aggregates_from_snapshot_async(user_id, doc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild per-user aggregates.")
+    parser.add_argument("user_ids", nargs="*", help="User IDs to rebuild")
+    parser.add_argument("--all", action="store_true", help="Rebuild every user")
+    args = parser.parse_args(argv)
+
+    if args.all:
+        user_ids = (doc.id for doc in db.collection("users").select([]).stream())
+    elif args.user_ids:
+        user_ids = args.user_ids
+    else:
+        parser.error("pass at least one user ID or --all")
+
+    for user_id in user_ids:
+        totals = rebuild_aggregates(user_id)
+        print(
+            f"{user_id}: income={totals['total_income']} "
+            f"expense={totals['total_expense']} "
+            f"cicilan={totals['total_cicilan_perbulan']} "
+            f"utang={totals['total_utang']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# services/batch_risk.py
+#
+# Nightly re-scoring of every user with the local risk engine.
+#
+#   python -m services.batch_risk [--chunk-size 300] [--checkpoint PATH] [--restart]
+#
+# Users are streamed in document-ID order, one page at a time. For each page
+# the aggregates, dependents and credit-history docs are read with a single
+# get_all() call, scored as one NumPy matrix, and written back as risk_scores
+# documents (plus each user's latest-score pointer) in batches. The last finished user ID is checkpointed after every
+# page so an interrupted run resumes where it stopped.
+
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from services.aggregates import aggregates_from_snapshot, aggregates_ref
+from services.firestore import db
+from services.log import configure_logging, get_logger
+from services.metrics import observe_firestore
+from services.risk_engine import (
+    ENGINE_VERSION,
+    classify,
+    explain,
+    extract_features,
+    feature_matrix,
+    is_confident,
+    score_matrix,
+)
+from services.risk_scores import input_fingerprint, record_score
+from services.snapshot import DOCUMENT_SECTIONS
+
+logger = get_logger(__name__)
+
+DEFAULT_CHUNK_SIZE = 300
+DEFAULT_CHECKPOINT = os.getenv("BATCH_RISK_CHECKPOINT", "batch_risk_checkpoint.json")
+# Firestore caps a batch at 500 writes; each user gets a history doc and a pointer
+WRITE_BATCH_SIZE = 500
+USERS_PER_BATCH = WRITE_BATCH_SIZE // 2
+
+
+def _main_doc_ref(user_ref, section: str):
+    collection, _ = DOCUMENT_SECTIONS[section]
+    return user_ref.collection(collection).document("main")
+
+
+def _load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, state: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _load_inputs(user_refs: list) -> tuple:
+    """Fetch each user's profile, aggregates, dependents and credit history in
+    one RPC. Returns (features, input fingerprints), one per user."""
+    refs = []
+    for user_ref in user_refs:
+        refs.append(user_ref)
+        refs.append(aggregates_ref(user_ref.id))
+        refs.extend(_main_doc_ref(user_ref, name) for name in DOCUMENT_SECTIONS)
+    with observe_firestore("batch", "get_all"):
+        docs = {doc.reference.path: doc for doc in db.get_all(refs)}
+
+    inputs = []
+    fingerprints = []
+    for user_ref in user_refs:
+        aggregates = aggregates_from_snapshot(
+            user_ref.id, docs[aggregates_ref(user_ref.id).path]
+        )
+        sections = {}
+        for name, (_, default) in DOCUMENT_SECTIONS.items():
+            doc = docs[_main_doc_ref(user_ref, name).path]
+            sections[name] = {**default, **doc.to_dict()} if doc.exists else dict(default)
+        inputs.append(
+            extract_features(aggregates, sections["dependents"], sections["credit_history"])
+        )
+        profile = docs[user_ref.path].to_dict() or {}
+        fingerprints.append(
+            input_fingerprint(
+                profile, aggregates, sections["dependents"], sections["credit_history"]
+            )
+        )
+    return inputs, fingerprints
+
+
+def score_chunk(user_refs: list, run_id: str) -> int:
+    features, fingerprints = _load_inputs(user_refs)
+    probabilities = score_matrix(feature_matrix(features))
+    levels = classify(probabilities)
+    confident = is_confident(probabilities)
+
+    now = datetime.utcnow()
+    scored = 0
+    for start in range(0, len(user_refs), USERS_PER_BATCH):
+        batch = db.batch()
+        for i in range(start, min(start + USERS_PER_BATCH, len(user_refs))):
+            level = str(levels[i])
+            record_score(
+                batch,
+                user_refs[i].id,
+                {
+                    "score": level,
+                    "probability": round(float(probabilities[i]), 4),
+                    "confident": bool(confident[i]),
+                    "features": features[i],
+                    "engine_version": ENGINE_VERSION,
+                    "generated_by_ai": False,
+                    "explanation": explain(features[i], level),
+                    "last_calculated": now,
+                    "batch_run_id": run_id,
+                },
+                fingerprints[i],
+            )
+            scored += 1
+        with observe_firestore("risk_scores", "commit"):
+            batch.commit()
+    return scored
+
+
+def run(
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    restart: bool = False,
+) -> dict:
+    state = {} if restart else _load_checkpoint(checkpoint_path)
+    if state.get("finished"):
+        state = {}
+    state.setdefault("run_id", uuid.uuid4().hex)
+    state.setdefault("processed", 0)
+    state.setdefault("started_at", datetime.utcnow().isoformat())
+
+    users = db.collection("users")
+    query = users.order_by("__name__").select([]).limit(chunk_size)
+    cursor = None
+    if state.get("last_user_id"):
+        with observe_firestore("users", "get"):
+            cursor = users.document(state["last_user_id"]).get()
+        logger.info(
+            "batch_risk.resumed",
+            extra={
+                "fields": {
+                    "run_id": state["run_id"],
+                    "last_user_id": state["last_user_id"],
+                    "processed": state["processed"],
+                }
+            },
+        )
+
+    start = time.perf_counter()
+    scored_this_session = 0
+    while True:
+        with observe_firestore("users", "query"):
+            page = list((query.start_after(cursor) if cursor else query).stream())
+        if not page:
+            break
+
+        scored_this_session += score_chunk([doc.reference for doc in page], state["run_id"])
+        cursor = page[-1]
+        state["processed"] += len(page)
+        state["last_user_id"] = cursor.id
+        _save_checkpoint(checkpoint_path, state)
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "batch_risk.progress",
+            extra={
+                "fields": {
+                    "run_id": state["run_id"],
+                    "processed": state["processed"],
+                    "users_per_second": round(
+                        scored_this_session / elapsed if elapsed else 0.0, 1
+                    ),
+                }
+            },
+        )
+
+    elapsed = time.perf_counter() - start
+    state["finished"] = True
+    state["elapsed_seconds"] = round(elapsed, 3)
+    state["users_per_second"] = round(scored_this_session / elapsed, 1) if elapsed else 0.0
+    _save_checkpoint(checkpoint_path, state)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score every user's risk.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore an unfinished checkpoint"
+    )
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    state = run(args.chunk_size, args.checkpoint, args.restart)
+    print(
+        f"Run {state['run_id']}: {state['processed']} users in "
+        f"{state['elapsed_seconds']}s ({state['users_per_second']} users/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# services/chat_context.py
+#
+# Bounded user context for DebtBot prompts. Instead of one line per
+# transaction, asset and loan, the context carries the aggregate totals, a
+# per-month/per-category transaction summary for the last few months and only
+# the most recent transactions verbatim, trimmed to a token budget.
+#
+# The rendered text is cached per user and reused until the aggregates
+# version counters or the profile change.
+#
+# CHAT_CONTEXT_TOKEN_BUDGET          approximate prompt tokens for the context
+# CHAT_CONTEXT_RECENT_TRANSACTIONS   transactions included line by line
+# CHAT_CONTEXT_MONTHS                months covered by the category summary
+# CHAT_CONTEXT_CACHE_SIZE            users kept in the rendered-context cache
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from services.aggregates import (
+    VERSION_FIELDS,
+    aggregates_from_snapshot_async,
+    aggregates_ref,
+    asset_value,
+)
+from services.firestore import async_db, get_documents_async
+from services.metrics import observe_firestore, registry
+
+TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1200"))
+RECENT_TRANSACTIONS = int(os.getenv("CHAT_CONTEXT_RECENT_TRANSACTIONS", "10"))
+SUMMARY_MONTHS = int(os.getenv("CHAT_CONTEXT_MONTHS", "6"))
+CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "1024"))
+
+# Rough heuristic for Gemini's tokenizer on mixed English/Indonesian text
+CHARS_PER_TOKEN = 4
+
+# Profile fields worth telling the model about; the rest of the user doc
+# (emails, phone numbers, onboarding flags) is left out of the prompt.
+PROFILE_FIELDS = ("full_name", "age", "occupation", "marital_status", "location")
+
+_cache = OrderedDict()  # user_id -> (cache key, rendered context)
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _cache_key(profile: dict, aggregates: dict) -> str:
+    payload = {
+        "profile": {k: profile.get(k) for k in PROFILE_FIELDS},
+        "versions": [aggregates.get(f, 0) for f in VERSION_FIELDS],
+        "rebuilt_at": str(aggregates.get("rebuilt_at")),
+        "settings": [TOKEN_BUDGET, RECENT_TRANSACTIONS, SUMMARY_MONTHS],
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _cache_get(user_id: str, key: str):
+    with _cache_lock:
+        entry = _cache.get(user_id)
+        if entry is None or entry[0] != key:
+            _cache_stats["misses"] += 1
+            return None
+        _cache.move_to_end(user_id)
+        _cache_stats["hits"] += 1
+        return entry[1]
+
+
+def _cache_put(user_id: str, key: str, context: str) -> None:
+    with _cache_lock:
+        _cache[user_id] = (key, context)
+        _cache.move_to_end(user_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(user_id: str) -> None:
+    with _cache_lock:
+        _cache.pop(user_id, None)
+
+
+def stats() -> dict:
+    with _cache_lock:
+        lookups = _cache_stats["hits"] + _cache_stats["misses"]
+        return {
+            **_cache_stats,
+            "size": len(_cache),
+            "hit_rate": _cache_stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+registry.register_cache("chat_context", stats)
+
+
+def _month(value) -> str:
+    return value.strftime("%Y-%m") if isinstance(value, datetime) else "unknown"
+
+
+def _day(value) -> str:
+    return value.strftime("%Y-%m-%d") if isinstance(value, datetime) else "unknown"
+
+
+async def _fetch_collection(user_ref, name: str) -> list:
+    with observe_firestore(name, "query"):
+        return [doc.to_dict() async for doc in user_ref.collection(name).stream()]
+
+
+async def _fetch_recent_transactions(user_ref) -> list:
+    query = (
+        user_ref.collection("transactions")
+        .order_by("created_at", direction=firestore.Query.DESCENDING)
+        .limit(RECENT_TRANSACTIONS)
+    )
+    with observe_firestore("transactions", "query"):
+        return [doc.to_dict() async for doc in query.stream()]
+
+
+async def _fetch_monthly_summary(user_ref) -> dict:
+    """Sum amounts per (month, type, category) over the last SUMMARY_MONTHS."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=31 * SUMMARY_MONTHS)
+    query = (
+        user_ref.collection("transactions")
+        .where(filter=FieldFilter("created_at", ">=", cutoff))
+        .select(["amount", "type", "category", "created_at"])
+    )
+    totals = {}
+    with observe_firestore("transactions", "query"):
+        async for doc in query.stream():
+            t = doc.to_dict()
+            key = (
+                _month(t.get("created_at")),
+                t.get("type", "unknown"),
+                t.get("category", "unknown"),
+            )
+            totals[key] = totals.get(key, 0) + t.get("amount", 0)
+    return totals
+
+
+def _render(profile, aggregates, loans, assets, recent, monthly) -> str:
+    """Render sections in priority order, trimming lines past the budget."""
+    sections = [
+        (
+            "User Profile",
+            [f"- {k}: {profile[k]}" for k in PROFILE_FIELDS if profile.get(k)],
+            "No profile details.",
+        ),
+        (
+            "Financial Summary",
+            [
+                f"- Total Income: Rp{aggregates['total_income']}",
+                f"- Total Expenses: Rp{aggregates['total_expense']}",
+                f"- Total Monthly Installments: Rp{aggregates['total_cicilan_perbulan']}",
+                f"- Total Remaining Debt: Rp{aggregates['total_utang']}",
+                f"- Total Asset Value: Rp{aggregates['total_assets']}",
+            ],
+            "",
+        ),
+        (
+            "Active Loans",
+            [
+                f"- {l.get('loan_type', 'unknown')}: Installment Rp{l.get('cicilanPerbulan', 0)}"
+                f" for {l.get('cicilanTotalBulan', 0)} months"
+                f" (remaining {l.get('cicilanTotalBulan', 0) - l.get('cicilanSudahDibayar', 0)} months)"
+                for l in loans
+                if l.get("is_active", True)
+            ],
+            "No active loans.",
+        ),
+        (
+            "Assets",
+            [
+                f"- {a.get('name') or a.get('displayName', 'Unknown')}: Rp{asset_value(a)}"
+                for a in assets
+            ],
+            "No assets.",
+        ),
+        (
+            f"Monthly Totals by Category (last {SUMMARY_MONTHS} months)",
+            [
+                f"- {month} {kind} {category}: Rp{amount}"
+                for (month, kind, category), amount in sorted(monthly.items(), reverse=True)
+            ],
+            "No transactions in this period.",
+        ),
+        (
+            "Most Recent Transactions",
+            [
+                f"- {_day(t.get('created_at'))} {t.get('type', 'unknown')}:"
+                f" Rp{t.get('amount', 0)} for {t.get('category', 'unknown')}"
+                for t in recent
+            ],
+            "No transactions.",
+        ),
+    ]
+
+    budget = TOKEN_BUDGET
+    blocks = []
+    for title, lines, empty in sections:
+        header = f"{title}:"
+        budget -= estimate_tokens(header)
+        kept = []
+        for index, line in enumerate(lines):
+            cost = estimate_tokens(line)
+            if cost > budget:
+                kept.append(f"- ... {len(lines) - index} more omitted")
+                break
+            kept.append(line)
+            budget -= cost
+        if not lines and empty:
+            kept.append(empty)
+        blocks.append("\n".join([header] + kept))
+
+    return "\n\n".join(blocks)
+
+
+async def build_chat_context(user_id: str) -> str:
+    user_ref = async_db.collection("users").document(user_id)
+    profile_doc, aggregates_doc = await get_documents_async(
+        [user_ref, aggregates_ref(user_id, client=async_db)]
+    )
+    if not profile_doc.exists:
+        raise HTTPException(status_code=404, detail="User not found")
+    profile = profile_doc.to_dict()
+    aggregates = await aggregates_from_snapshot_async(user_id, aggregates_doc)
+
+    key = _cache_key(profile, aggregates)
+    cached = _cache_get(user_id, key)
+    if cached is not None:
+        return cached
+
+    loans, assets, recent, monthly = await asyncio.gather(
+        _fetch_collection(user_ref, "loans"),
+        _fetch_collection(user_ref, "assets"),
+        _fetch_recent_transactions(user_ref),
+        _fetch_monthly_summary(user_ref),
+    )
+    context = _render(profile, aggregates, loans, assets, recent, monthly) + "\n\n"
+    _cache_put(user_id, key, context)
+    return context
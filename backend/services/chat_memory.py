@@ -0,0 +1,120 @@
+# services/chat_memory.py
+#
+# Conversation memory for chatrooms, stored on the chatroom document:
+#   memory_turns    the last CHAT_MEMORY_TURNS exchanges, verbatim
+#   memory_summary  a rolling summary of everything older
+# After each reply the new exchange is appended; exchanges pushed out of the
+# verbatim window are folded into the summary with one short Gemini call, so
+# the memory part of the prompt stays the same size however long the room is.
+#
+# Two replies in the same room can finish close together, and their memory
+# updates run as background tasks. The summarize call stays outside any
+# transaction; the write then commits in a transaction only if memory_turns is
+# still what the update was computed from, and the whole update is recomputed
+# otherwise.
+
+import os
+
+from google.cloud import firestore
+from services.firestore import async_db
+from services.llm_cache import generate_cached_async
+from services.log import get_logger
+from services.metrics import observe_firestore
+
+logger = get_logger(__name__)
+
+MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "6"))
+SUMMARY_WORDS = int(os.getenv("CHAT_MEMORY_SUMMARY_WORDS", "150"))
+UPDATE_ATTEMPTS = 5
+
+SPEAKERS = {"user": "User", "assistant": "DebtBot"}
+
+
+def render_memory(room_data: dict) -> str:
+    """Prompt section with the rolling summary and the recent turns."""
+    summary = room_data.get("memory_summary")
+    turns = room_data.get("memory_turns") or []
+    blocks = []
+    if summary:
+        blocks.append(f"Earlier conversation summary:\n{summary}")
+    if turns:
+        blocks.append(
+            "Recent conversation:\n"
+            + "\n".join(f"{SPEAKERS[t['role']]}: {t['text']}" for t in turns)
+        )
+    return "\n\n".join(blocks) + "\n\n" if blocks else ""
+
+
+def append_turn(room_data: dict, user_text: str, ai_text: str) -> tuple:
+    """Return (turns to keep, turns that fell out of the verbatim window)."""
+    turns = list(room_data.get("memory_turns") or [])
+    turns.append({"role": "user", "text": user_text})
+    turns.append({"role": "assistant", "text": ai_text})
+    keep = MEMORY_TURNS * 2
+    if len(turns) <= keep:
+        return turns, []
+    return turns[-keep:], turns[:-keep]
+
+
+async def summarize(model, previous_summary: str, overflow: list) -> str:
+    transcript = "\n".join(f"{SPEAKERS[t['role']]}: {t['text']}" for t in overflow)
+    prompt = (
+        "You maintain the memory of a conversation between a user and DebtBot, "
+        "a personal finance assistant. Update the summary below with the new "
+        "messages. Keep facts the user shared about their finances, goals and "
+        "decisions, and advice already given. "
+        f"Answer with the updated summary only, at most {SUMMARY_WORDS} words.\n\n"
+        f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    return (await generate_cached_async(model, prompt)).strip()
+
+
+async def _write_if_unchanged(chatroom_ref, expected_turns, update: dict) -> bool:
+    """Apply `update` only if memory_turns still equals `expected_turns`."""
+
+    @firestore.async_transactional
+    async def apply(transaction):
+        room = await chatroom_ref.get(transaction=transaction)
+        if ((room.to_dict() or {}).get("memory_turns") or []) != expected_turns:
+            return False
+        transaction.update(chatroom_ref, update)
+        return True
+
+    with observe_firestore("chatrooms", "transaction"):
+        return await apply(async_db.transaction())
+
+
+async def update_memory(model, chatroom_ref, user_text: str, ai_text: str) -> None:
+    """Append one exchange to the room's memory, folding overflow into the summary."""
+    for _ in range(UPDATE_ATTEMPTS):
+        with observe_firestore("chatrooms", "get"):
+            room = await chatroom_ref.get()
+        room_data = room.to_dict() or {}
+        update = await _memory_update(model, room_data, user_text, ai_text)
+        if await _write_if_unchanged(
+            chatroom_ref, room_data.get("memory_turns") or [], update
+        ):
+            return
+    logger.warning(
+        "chat_memory.update_conflict",
+        extra={"fields": {"room": chatroom_ref.path, "attempts": UPDATE_ATTEMPTS}},
+    )
+
+
+async def _memory_update(model, room_data: dict, user_text: str, ai_text: str) -> dict:
+    turns, overflow = append_turn(room_data, user_text, ai_text)
+
+    update = {"memory_turns": turns}
+    if overflow:
+        try:
+            update["memory_summary"] = await summarize(
+                model, room_data.get("memory_summary", ""), overflow
+            )
+        except Exception as e:
+            # Keep (a bounded amount of) the overflow and retry after the next reply
+            logger.warning(
+                "chat_memory.summarize_failed", extra={"fields": {"error": str(e)}}
+            )
+            update["memory_turns"] = (overflow + turns)[-MEMORY_TURNS * 4 :]
+    return update
@@ -0,0 +1,241 @@
+# services/clients.py
+#
+# Process-wide clients, created on first use instead of at import time:
+#   firebase_app      the firebase_admin app; credentials are parsed once and
+#                     shared by Firestore and ID-token verification
+#   firestore         sync and async Firestore clients (see FIRESTORE_BACKEND)
+#   firestore_async
+#   gemini_model      one GenerativeModel shared by every router
+#
+# main.py's lifespan warms them up in the background (CLIENTS_WARMUP=0 to
+# skip) and /metrics reports how long each took to create. Routes get the
+# Gemini model through Depends(get_gemini_model); Firestore stays reachable as
+# `db` / `async_db` in services/firestore.py, which resolve on first use.
+#
+# Where documents live:
+#   FIRESTORE_BACKEND=memory   in-process fake (services/memory_firestore.py) for
+#                              benchmarks and running without credentials
+#   FIRESTORE_EMULATOR_HOST    the Firestore emulator; no credentials needed
+#   otherwise                  Firebase with the FIREBASE_CREDENTIALS service account
+
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from services.log import get_logger
+from services.metrics import client_init_duration
+
+# load_dotenv() is generally safe to call.
+# If .env is not found (e.g., in production), it does nothing.
+load_dotenv()
+
+logger = get_logger(__name__)
+
+FIRESTORE_BACKEND = os.environ.get("FIRESTORE_BACKEND", "firebase").lower()
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+
+
+class ClientRegistry:
+    """Named clients built by factories on first get(), once per process."""
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self._locks = {}
+        self.init_ms = {}  # name -> milliseconds the factory took
+
+    def register(self, name: str, factory) -> None:
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._locks[name]:
+            if name not in self._clients:
+                start = time.perf_counter()
+                self._clients[name] = self._factories[name]()
+                elapsed = time.perf_counter() - start
+                self.init_ms[name] = elapsed * 1000
+                client_init_duration.set(elapsed, client=name)
+                logger.info(
+                    "clients.initialized",
+                    extra={"fields": {"client": name, "ms": round(elapsed * 1000, 1)}},
+                )
+            return self._clients[name]
+
+    def override(self, name: str, client) -> None:
+        """Use `client` instead of building one (benchmarks, tests)."""
+        self._clients[name] = client
+
+    def initialized(self) -> list:
+        return sorted(self._clients)
+
+    def warm_up(self, names=None) -> None:
+        for name in names or self._factories:
+            try:
+                self.get(name)
+            except Exception as e:
+                # The request that needs it will raise the real error
+                logger.error(
+                    "clients.warm_up_failed",
+                    extra={"fields": {"client": name, "error": str(e)}},
+                )
+
+
+def load_firebase_credentials() -> dict:
+    # GOOGLE_APPLICATION_CREDENTIALS is what auth_utils used to read; accept it
+    # so deployments that only set that one keep working.
+    firebase_env_var = os.environ.get("FIREBASE_CREDENTIALS") or os.environ.get(
+        "GOOGLE_APPLICATION_CREDENTIALS"
+    )
+
+    if not firebase_env_var:
+        raise RuntimeError(
+            "FIREBASE_CREDENTIALS environment variable not set. "
+            "This should be the JSON content of your service account key or a path to the JSON file."
+        )
+
+    cred_dict = None
+    # For error reporting, store a snippet of what was processed.
+    # Initialize with a safe default or the start of the env var.
+    processed_source_snippet = firebase_env_var[:100] + "..." if len(firebase_env_var) > 100 else firebase_env_var
+
+    try:
+        # Attempt to parse the environment variable as JSON directly
+        cred_dict = json.loads(firebase_env_var)
+        # If successful, FIREBASE_CREDENTIALS contained the JSON content.
+        # processed_source_snippet is already set correctly.
+    except json.JSONDecodeError:
+        # If parsing fails, assume it's a file path (for local dev or specific setups)
+        firebase_credentials_path = firebase_env_var
+        processed_source_snippet = f"path: {firebase_credentials_path}" # Update snippet for path case
+        try:
+            with open(firebase_credentials_path, 'r', encoding='utf-8') as f:
+                credentials_content_from_file = f.read()
+                # Update snippet for file content if read successfully
+                processed_source_snippet = credentials_content_from_file[:100] + "..." if len(credentials_content_from_file) > 100 else credentials_content_from_file
+                cred_dict = json.loads(credentials_content_from_file)
+        except FileNotFoundError:
+            raise RuntimeError(
+                f"Firebase credentials file not found at path: {firebase_credentials_path}. "
+                "Ensure FIREBASE_CREDENTIALS is set to the correct file path in your .env (for local) "
+                "or that the file exists at this path in your deployment environment if not providing direct JSON."
+            )
+        except json.JSONDecodeError as e_file:
+            raise RuntimeError(
+                f"Error decoding JSON from Firebase credentials file '{firebase_credentials_path}'. "
+                f"Content snippet: '{processed_source_snippet}'. Error: {e_file}"
+            )
+        except Exception as e_file_other: # Catch other file-related errors
+            raise RuntimeError(
+                f"Error reading or parsing Firebase credentials file '{firebase_credentials_path}': {e_file_other}"
+            )
+    except Exception as e_main:
+        # This catches errors from the initial json.loads(firebase_env_var) or unexpected issues.
+        raise RuntimeError(
+            f"An unexpected error occurred processing FIREBASE_CREDENTIALS. "
+            f"Processed source snippet: '{processed_source_snippet}'. Error: {e_main}"
+        )
+
+    if cred_dict is None:
+        # This case should ideally not be reached if the logic above is correct and firebase_env_var is set.
+        raise RuntimeError(
+            "Failed to load Firebase credentials. "
+            "FIREBASE_CREDENTIALS was set but could not be interpreted as JSON content or a valid file path. "
+            f"Processed source snippet: '{processed_source_snippet}'"
+        )
+
+    return cred_dict
+
+
+def _firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Initialize Firebase app only if it hasn't been initialized yet.
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    return firebase_admin.initialize_app(
+        credentials.Certificate(load_firebase_credentials())
+    )
+
+
+def _memory_store():
+    from services.memory_firestore import MemoryStore
+
+    return MemoryStore()
+
+
+def _firestore():
+    if FIRESTORE_BACKEND == "memory":
+        from services.memory_firestore import MemoryClient
+
+        return MemoryClient(registry.get("memory_store"))
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore
+
+        # The client picks up the emulator host and project from the environment
+        return firestore.Client()
+    from firebase_admin import firestore
+
+    return firestore.client(app=registry.get("firebase_app"))
+
+
+def _firestore_async():
+    # Async client for `async def` routes, so Firestore I/O doesn't block the event loop
+    if FIRESTORE_BACKEND == "memory":
+        from services.memory_firestore import MemoryAsyncClient
+
+        return MemoryAsyncClient(registry.get("memory_store"))
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore
+
+        return firestore.AsyncClient()
+    from firebase_admin import firestore_async
+
+    return firestore_async.client(app=registry.get("firebase_app"))
+
+
+def _gemini_model():
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+registry = ClientRegistry()
+registry.register("firebase_app", _firebase_app)
+registry.register("memory_store", _memory_store)
+registry.register("firestore", _firestore)
+registry.register("firestore_async", _firestore_async)
+registry.register("gemini_model", _gemini_model)
+
+# What the lifespan warms up; the memory store and Firebase app come along as
+# dependencies when they are needed.
+WARM_UP = ("firestore", "firestore_async", "gemini_model")
+
+
+def firebase_app():
+    return registry.get("firebase_app")
+
+
+def get_gemini_model():
+    """FastAPI dependency for the shared Gemini model."""
+    return registry.get("gemini_model")
+
+
+class LazyClient:
+    """Forwards attribute access to a registry client, created on first use."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(registry.get(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyClient {self._name}>"
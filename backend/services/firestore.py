@@ -1,78 +1,143 @@
-import json
-import os
-from dotenv import load_dotenv
-import firebase_admin # Import firebase_admin
-from firebase_admin import credentials, firestore, initialize_app
-
-# load_dotenv() is generally safe to call.
-# If .env is not found (e.g., in production), it does nothing.
-load_dotenv()
-
-firebase_env_var = os.environ.get("FIREBASE_CREDENTIALS")
-
-if not firebase_env_var:
-    raise RuntimeError(
-        "FIREBASE_CREDENTIALS environment variable not set. "
-        "This should be the JSON content of your service account key or a path to the JSON file."
-    )
-
-cred_dict = None
-# For error reporting, store a snippet of what was processed.
-# Initialize with a safe default or the start of the env var.
-processed_source_snippet = firebase_env_var[:100] + "..." if len(firebase_env_var) > 100 else firebase_env_var
-
-try:
-    # Attempt to parse the environment variable as JSON directly
-    cred_dict = json.loads(firebase_env_var)
-    # If successful, FIREBASE_CREDENTIALS contained the JSON content.
-    # processed_source_snippet is already set correctly.
-except json.JSONDecodeError:
-    # If parsing fails, assume it's a file path (for local dev or specific setups)
-    firebase_credentials_path = firebase_env_var
-    processed_source_snippet = f"path: {firebase_credentials_path}" # Update snippet for path case
-    try:
-        with open(firebase_credentials_path, 'r', encoding='utf-8') as f:
-            credentials_content_from_file = f.read()
-            # Update snippet for file content if read successfully
-            processed_source_snippet = credentials_content_from_file[:100] + "..." if len(credentials_content_from_file) > 100 else credentials_content_from_file
-            cred_dict = json.loads(credentials_content_from_file)
-    except FileNotFoundError:
-        raise RuntimeError(
-            f"Firebase credentials file not found at path: {firebase_credentials_path}. "
-            "Ensure FIREBASE_CREDENTIALS is set to the correct file path in your .env (for local) "
-            "or that the file exists at this path in your deployment environment if not providing direct JSON."
-        )
-    except json.JSONDecodeError as e_file:
-        raise RuntimeError(
-            f"Error decoding JSON from Firebase credentials file '{firebase_credentials_path}'. "
-            f"Content snippet: '{processed_source_snippet}'. Error: {e_file}"
-        )
-    except Exception as e_file_other: # Catch other file-related errors
-        raise RuntimeError(
-            f"Error reading or parsing Firebase credentials file '{firebase_credentials_path}': {e_file_other}"
-        )
-except Exception as e_main:
-    # This catches errors from the initial json.loads(firebase_env_var) or unexpected issues.
-    raise RuntimeError(
-        f"An unexpected error occurred processing FIREBASE_CREDENTIALS. "
-        f"Processed source snippet: '{processed_source_snippet}'. Error: {e_main}"
-    )
-
-if cred_dict is None:
-    # This case should ideally not be reached if the logic above is correct and firebase_env_var is set.
-    raise RuntimeError(
-        "Failed to load Firebase credentials. "
-        "FIREBASE_CREDENTIALS was set but could not be interpreted as JSON content or a valid file path. "
-        f"Processed source snippet: '{processed_source_snippet}'"
-    )
-
-cred = credentials.Certificate(cred_dict)
-
-# Initialize Firebase app only if it hasn't been initialized yet.
-if not firebase_admin._apps:
-    default_app = initialize_app(cred)
-else:
-    default_app = firebase_admin.get_app() # Get the already initialized app
-
-# Initialize Firestore client with the specific app
-db = firestore.client(app=default_app)
+import contextvars
+import threading
+
+from services.clients import LazyClient
+from services.metrics import observe_firestore
+
+# Created on first use by services/clients.py, so importing this module does
+# not parse credentials or open connections.
+db = LazyClient("firestore")
+# Async client for `async def` routes, so Firestore I/O doesn't block the event loop
+async_db = LazyClient("firestore_async")
+
+
+# --- Request-scoped document reads ---------------------------------------
+#
+# Within one request the same document is often needed by several helpers
+# (existence checks, the snapshot loader, the chat context builder). Reads that
+# go through get_document()/get_documents() are remembered in an identity map
+# for the lifetime of the request, and documents that are not cached yet are
+# fetched together with a single get_all() round trip.
+#
+# main.py opens a scope per HTTP request; outside a scope (CLI jobs, tests)
+# every call reads from Firestore as usual. Snapshots are read-only, so code
+# that writes a document and reads it again in the same request must call
+# forget() in between.
+
+
+class RequestReads:
+    """Identity map and read counters for one request."""
+
+    def __init__(self):
+        self.snapshots = {}  # document path -> DocumentSnapshot
+        self.requested = 0  # documents asked for
+        self.served = 0  # ...answered from the identity map
+        self.round_trips = 0  # get_all() RPCs actually sent
+        self._lock = threading.Lock()
+
+    def lookup(self, refs) -> list:
+        """Count the request and return the refs that still need fetching."""
+        with self._lock:
+            missing = [ref for ref in _unique(refs) if ref.path not in self.snapshots]
+            self.requested += len(refs)
+            self.served += len(refs) - len(missing)
+            return missing
+
+    def store(self, snapshots) -> None:
+        with self._lock:
+            self.round_trips += 1
+            for snapshot in snapshots:
+                self.snapshots[snapshot.reference.path] = snapshot
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requested": self.requested,
+                "served": self.served,
+                "round_trips": self.round_trips,
+            }
+
+
+_request_reads = contextvars.ContextVar("firestore_request_reads", default=None)
+
+
+def begin_request_reads():
+    """Open a read scope; returns a token for end_request_reads()."""
+    return _request_reads.set(RequestReads())
+
+
+def end_request_reads(token) -> None:
+    _request_reads.reset(token)
+
+
+def current_request_reads():
+    return _request_reads.get()
+
+
+def forget(*refs) -> None:
+    """Drop documents written in this request from the identity map."""
+    reads = _request_reads.get()
+    if reads is None:
+        return
+    with reads._lock:
+        for ref in refs:
+            reads.snapshots.pop(ref.path, None)
+
+
+def _unique(refs) -> list:
+    seen = {}
+    for ref in refs:
+        seen.setdefault(ref.path, ref)
+    return list(seen.values())
+
+
+def _batch_label(refs) -> str:
+    collections = {ref.parent.id for ref in refs}
+    return collections.pop() if len(collections) == 1 else "batch"
+
+
+def _resolve(refs, fetched: dict, reads) -> list:
+    if reads is not None:
+        with reads._lock:
+            fetched = {**reads.snapshots, **fetched}
+    return [fetched[ref.path] for ref in refs]
+
+
+def get_documents(refs) -> list:
+    """Snapshots for `refs`, in order, with one get_all() for uncached ones."""
+    refs = list(refs)
+    reads = _request_reads.get()
+    missing = reads.lookup(refs) if reads is not None else _unique(refs)
+
+    fetched = {}
+    if missing:
+        with observe_firestore(_batch_label(missing), "get_all"):
+            snapshots = list(db.get_all(missing))
+        fetched = {snapshot.reference.path: snapshot for snapshot in snapshots}
+        if reads is not None:
+            reads.store(snapshots)
+    return _resolve(refs, fetched, reads)
+
+
+def get_document(ref):
+    return get_documents([ref])[0]
+
+
+async def get_documents_async(refs) -> list:
+    """get_documents() for async_db references."""
+    refs = list(refs)
+    reads = _request_reads.get()
+    missing = reads.lookup(refs) if reads is not None else _unique(refs)
+
+    fetched = {}
+    if missing:
+        with observe_firestore(_batch_label(missing), "get_all"):
+            snapshots = [snapshot async for snapshot in async_db.get_all(missing)]
+        fetched = {snapshot.reference.path: snapshot for snapshot in snapshots}
+        if reads is not None:
+            reads.store(snapshots)
+    return _resolve(refs, fetched, reads)
+
+
+async def get_document_async(ref):
+    return (await get_documents_async([ref]))[0]
@@ -0,0 +1,411 @@
+# services/jobs.py
+#
+# SQLite-backed background jobs for work too slow to hold an HTTP worker
+# (risk generation: Firestore reads plus a Gemini call). The route enqueues
+# and answers 202 with the job ID; a worker thread claims the job, runs its
+# handler and stores the result for GET /users/{user_id}/jobs/{job_id}.
+#
+# - Deduplication: enqueueing a job whose dedup key matches a queued or running
+#   job returns that job instead of a new one.
+# - Retry: a failed attempt is retried with exponential backoff up to
+#   JOBS_MAX_ATTEMPTS; JobFailed marks a failure that retrying can't fix.
+# - Leases: a claimed job whose worker died or hung is claimed again once its
+#   lease runs out, or marked failed if it has used up its attempts. Each claim
+#   bumps `attempts`, which doubles as the lease token: a worker whose job was
+#   claimed again can no longer record a result for it.
+#
+# Workers run inside each API process by default. To run them separately,
+# set JOBS_WORKERS=0 for the API and start:
+#   python -m services.jobs --workers 4
+#
+# JOBS_DB_PATH            SQLite file shared by the API and the workers
+# JOBS_WORKERS            worker threads per API process (0 = none)
+# JOBS_MAX_ATTEMPTS       attempts before a job is marked failed
+# JOBS_RETRY_SECONDS      backoff before the first retry; doubles each time
+# JOBS_LEASE_SECONDS      how long a claimed job stays with its worker
+# JOBS_RETENTION_SECONDS  finished jobs older than this are deleted
+
+import argparse
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from services.log import configure_logging, get_logger
+from services.metrics import job_duration, jobs_total
+
+logger = get_logger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETRY_SECONDS = float(os.getenv("JOBS_RETRY_SECONDS", "2"))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", "86400"))
+POLL_SECONDS = 0.5
+
+# Modules whose import registers job handlers (for the standalone worker)
+HANDLER_MODULES = ("routes.risk_score",)
+
+
+class JobFailed(Exception):
+    """Raised by a handler for a failure that retrying won't fix."""
+
+
+class JobStore:
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, user_id TEXT,"
+                " dedup_key TEXT, payload TEXT NOT NULL, status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+                " result TEXT, error TEXT, run_after REAL NOT NULL,"
+                " lease_expires REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            # At most one active job per dedup key
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedup ON jobs (dedup_key)"
+                " WHERE status IN ('queued', 'running') AND dedup_key IS NOT NULL"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, run_after)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets the API read while workers write.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        # Take the write lock up front so check-then-write can't interleave
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        user_id: str | None = None,
+        dedup_key: str | None = None,
+        max_attempts: int = JOBS_MAX_ATTEMPTS,
+    ) -> tuple:
+        """Add a job; returns (job, created). An active duplicate is returned as is."""
+        conn = self._transaction()
+        try:
+            if dedup_key is not None:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE dedup_key = ?"
+                    " AND status IN ('queued', 'running')",
+                    (dedup_key,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return _job(row), False
+            now = self._clock()
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, user_id, dedup_key, payload, status,"
+                " max_attempts, run_after, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    user_id,
+                    dedup_key,
+                    json.dumps(payload),
+                    max_attempts,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+            return _job(row), True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, lease_seconds: float = JOBS_LEASE_SECONDS):
+        """Take the oldest runnable job (or one whose lease ran out), or None."""
+        conn = self._transaction()
+        try:
+            now = self._clock()
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?)"
+                    " OR (status = 'running' AND lease_expires < ?)"
+                    " ORDER BY run_after LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["status"] == "queued" or row["attempts"] < row["max_attempts"]:
+                    break
+                # Its last attempt killed or hung the worker; don't hand it out again
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_expires = NULL,"
+                    " updated_at = ? WHERE id = ?",
+                    (
+                        f"Lease expired on attempt {row['attempts']} of {row['max_attempts']}",
+                        now,
+                        row["id"],
+                    ),
+                )
+                jobs_total.inc(kind=row["kind"], outcome="failed")
+                logger.warning(
+                    "jobs.lease_exhausted",
+                    extra={"fields": {"job_id": row["id"], "kind": row["kind"]}},
+                )
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1,"
+                " lease_expires = ?, updated_at = ? WHERE id = ?",
+                (now + lease_seconds, now, row["id"]),
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+            return _job(row)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Matches only while the job is still held by the claim that returned `job`
+    _HELD = " WHERE id = ? AND status = 'running' AND attempts = ?"
+
+    def complete(self, job: dict, result) -> bool:
+        """Store the result; False when the lease was lost to another worker."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL,"
+            " lease_expires = NULL, updated_at = ?" + self._HELD,
+            (json.dumps(result, default=str), self._clock(), job["id"], job["attempts"]),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job: dict, error: str, retry: bool = True) -> str:
+        """Record a failed attempt: "retried", "failed", or "lost" when the
+        lease had already passed to another worker."""
+        now = self._clock()
+        if retry and job["attempts"] < job["max_attempts"]:
+            backoff = JOBS_RETRY_SECONDS * 2 ** (job["attempts"] - 1)
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = 'queued', error = ?, run_after = ?,"
+                " lease_expires = NULL, updated_at = ?" + self._HELD,
+                (error, now + backoff, now, job["id"], job["attempts"]),
+            )
+            outcome = "retried"
+        else:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_expires = NULL,"
+                " updated_at = ?" + self._HELD,
+                (error, now, job["id"], job["attempts"]),
+            )
+            outcome = "failed"
+        return outcome if cursor.rowcount == 1 else "lost"
+
+    def get(self, job_id: str):
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return _job(row) if row is not None else None
+
+    def prune(self, older_than: float = JOBS_RETENTION_SECONDS) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+            (self._clock() - older_than,),
+        )
+        return cursor.rowcount
+
+
+def _job(row) -> dict:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+def job_summary(job: dict) -> dict:
+    """The API view of a job."""
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": datetime.fromtimestamp(job["created_at"], timezone.utc),
+        "updated_at": datetime.fromtimestamp(job["updated_at"], timezone.utc),
+    }
+
+
+_handlers = {}
+
+
+def handler(kind: str):
+    """Register `fn(payload) -> result` as the handler for a job kind."""
+
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def run_one(store: JobStore) -> bool:
+    """Claim and run one job; returns False when nothing was runnable."""
+    job = store.claim()
+    if job is None:
+        return False
+    fields = {"job_id": job["id"], "kind": job["kind"], "attempt": job["attempts"]}
+    fn = _handlers.get(job["kind"])
+    start = time.perf_counter()
+    try:
+        if fn is None:
+            raise JobFailed(f"No handler for job kind {job['kind']!r}")
+        result = fn(job["payload"])
+    except Exception as e:
+        outcome = store.fail(
+            job, str(e) or type(e).__name__, retry=not isinstance(e, JobFailed)
+        )
+        jobs_total.inc(kind=job["kind"], outcome=outcome)
+        logger.warning(f"jobs.{outcome}", extra={"fields": {**fields, "error": str(e)}})
+    else:
+        outcome = "succeeded" if store.complete(job, result) else "lost"
+        jobs_total.inc(kind=job["kind"], outcome=outcome)
+        if outcome == "lost":
+            logger.warning("jobs.lost", extra={"fields": fields})
+        else:
+            logger.info("jobs.succeeded", extra={"fields": fields})
+    finally:
+        job_duration.observe(time.perf_counter() - start, kind=job["kind"])
+    return True
+
+
+class WorkerPool:
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self.workers = workers
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"jobs-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def notify(self) -> None:
+        """Wake an idle worker (after an enqueue in this process)."""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if run_one(self.store):
+                    continue
+                self._maybe_prune()
+            except Exception:
+                logger.exception("jobs.worker_error")
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+    def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if now - self._last_prune > 60:
+            self._last_prune = now
+            self.store.prune()
+
+
+_store = None
+_pool = None
+_init_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    global _store
+    with _init_lock:
+        if _store is None:
+            _store = JobStore(JOBS_DB_PATH)
+        return _store
+
+
+def start_workers(workers: int = JOBS_WORKERS):
+    """Start this process's worker threads (once); None when workers are off."""
+    global _pool
+    if workers <= 0:
+        return None
+    store = get_store()
+    with _init_lock:
+        if _pool is None:
+            _pool = WorkerPool(store, workers)
+    _pool.start()
+    return _pool
+
+
+def stop_workers() -> None:
+    if _pool is not None:
+        _pool.stop()
+
+
+def submit(
+    kind: str, payload: dict, user_id: str | None = None, dedup_key: str | None = None
+) -> tuple:
+    """Enqueue a job and wake a local worker; returns (job, created)."""
+    job, created = get_store().enqueue(kind, payload, user_id, dedup_key)
+    jobs_total.inc(kind=kind, outcome="enqueued" if created else "deduplicated")
+    pool = start_workers()
+    if pool is not None:
+        pool.notify()
+    return job, created
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--workers", type=int, default=max(JOBS_WORKERS, 1))
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+    pool = start_workers(args.workers)
+    logger.info("jobs.workers_started", extra={"fields": {"workers": args.workers}})
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# services/llm_cache.py
+#
+# Content-addressed cache for Gemini responses. Entries are keyed by a
+# SHA-256 of model name + prompt, so a byte-identical prompt (pressing
+# "generate" twice on unchanged data, a repeated FAQ with the same profile
+# summary) is answered without calling the model again.
+#
+# LLM_CACHE_BACKEND      memory (default), sqlite (shared by all workers on a
+#                        host) or off
+# LLM_CACHE_PATH         SQLite file for the sqlite backend
+# LLM_CACHE_TTL_SECONDS  entry lifetime
+# LLM_CACHE_MAX_ENTRIES  LRU bound
+# LLM_MAX_CONCURRENCY    in-flight async Gemini calls allowed per worker
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.metrics import gemini_duration, record_gemini_usage, registry
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: str, expires_at: float) -> int:
+        """Store an entry and return how many entries were evicted."""
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets several workers read concurrently.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            return row
+
+    def set(self, key: str, value: str, expires_at: float) -> int:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time()),
+            )
+            cursor = conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            return cursor.rowcount
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl_seconds: float, clock=time.time):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model_name: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] <= self._clock():
+            self.backend.delete(key)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, value: str) -> None:
+        evicted = self.backend.set(key, value, self._clock() + self.ttl_seconds)
+        with self._lock:
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "size": len(self.backend),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _build_cache():
+    backend_name = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    ttl_seconds = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    if backend_name == "off":
+        return None
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(
+            os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3"), max_entries
+        )
+    else:
+        backend = MemoryBackend(max_entries)
+    return ResponseCache(backend, ttl_seconds)
+
+
+response_cache = _build_cache()
+if response_cache is not None:
+    registry.register_cache("llm_response", response_cache.stats)
+
+# Caps concurrent Gemini calls from one worker's event loop so a burst of chats
+# queues here instead of piling up against the API quota.
+llm_semaphore = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+
+
+def model_name_of(model) -> str:
+    return getattr(model, "model_name", type(model).__name__)
+
+
+def generate_cached(model, prompt: str, cache=None) -> str:
+    """Return the model's text for `prompt`, serving repeats from the cache.
+
+    `model` is anything with a Gemini-style `generate_content()`, so a stub
+    model can be passed in to exercise the cache without network calls.
+    """
+    cache = cache or response_cache
+    key = cache.key(model_name_of(model), prompt) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    with gemini_duration.time(model=model_name_of(model), mode="sync"):
+        response = model.generate_content(prompt)
+    record_gemini_usage(model_name_of(model), response)
+
+    if key is not None:
+        cache.put(key, response.text)
+    return response.text
+
+
+async def generate_cached_async(model, prompt: str, cache=None) -> str:
+    """Async generate_cached() using `generate_content_async()`."""
+    cache = cache or response_cache
+    key = cache.key(model_name_of(model), prompt) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    async with llm_semaphore:
+        with gemini_duration.time(model=model_name_of(model), mode="async"):
+            response = await model.generate_content_async(prompt)
+    record_gemini_usage(model_name_of(model), response)
+
+    if key is not None:
+        cache.put(key, response.text)
+    return response.text
+
+
+async def stream_cached_async(model, prompt: str, cache=None):
+    """Yield the reply text chunk by chunk as Gemini streams it.
+
+    A cached reply is yielded as a single chunk; a freshly streamed one is
+    cached once complete.
+    """
+    cache = cache or response_cache
+    key = cache.key(model_name_of(model), prompt) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    async with llm_semaphore:
+        with gemini_duration.time(model=model_name_of(model), mode="stream"):
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+    record_gemini_usage(model_name_of(model), response)
+
+    if key is not None and parts:
+        cache.put(key, "".join(parts))
@@ -0,0 +1,62 @@
+# services/log.py
+#
+# Structured (one JSON object per line) logging with sampling.
+#
+# LOG_LEVEL        minimum level, default INFO
+# LOG_SAMPLE_RATE  fraction of DEBUG/INFO records kept (0..1, default 1);
+#                  WARNING and above are always kept
+#
+# Usage:
+#   logger = get_logger(__name__)
+#   logger.info("risk_score.generated", extra={"fields": {"user_id": uid}})
+# Put identifiers and sizes in `fields`, never raw profiles or transactions.
+
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging() -> None:
+    """Install the JSON handler on the root logger (idempotent)."""
+    root = logging.getLogger()
+    if any(getattr(h, "_debtwatch", False) for h in root.handlers):
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "1"))))
+    handler._debtwatch = True
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -0,0 +1,863 @@
+# services/memory_firestore.py
+#
+# In-memory stand-in for the Firestore client, used by the benchmark suite and
+# for running the API locally without credentials (FIRESTORE_BACKEND=memory).
+#
+# It covers the part of the API this backend uses: documents and
+# sub-collections, get_all(), batches, transactions (including
+# @firestore.transactional), queries with where / order_by / limit /
+# start_after / select and count(), the field transforms (Increment,
+# SERVER_TIMESTAMP, DELETE_FIELD, ArrayUnion, ArrayRemove) and async variants
+# of all of them. Batches and transactions are applied atomically at commit.
+# Sync transactions have no conflict detection; async ones
+# (@firestore.async_transactional) abort and retry when a document they read
+# changed before their commit. Document and collection on_snapshot() listeners
+# are called synchronously: once when attached, then after every commit that
+# touches their target.
+#
+# MEMORY_FIRESTORE_LATENCY_MS adds a fixed delay to every RPC so that changes
+# in the number of round trips show up in latency measurements.
+
+import asyncio
+import functools
+import heapq
+import os
+import random
+import string
+import threading
+import time
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import Aborted, AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_MISSING = object()
+
+
+def _auto_id() -> str:
+    return "".join(random.choices(_AUTO_ID_CHARS, k=20))
+
+
+def _copy(value):
+    # Stored values are plain dicts/lists/scalars; datetimes are immutable.
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy(v) for v in value]
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # Firestore stores UTC; naive datetimes are read back as UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _get_field(data: dict, field_path: str):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _transform(current, value):
+    if value is transforms.DELETE_FIELD:
+        return _MISSING
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) else 0
+        return base + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if current is _MISSING else max(current, value.value)
+    if isinstance(value, transforms.Minimum):
+        return value.value if current is _MISSING else min(current, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        return base + [v for v in _copy(value.values) if v not in base]
+    if isinstance(value, transforms.ArrayRemove):
+        base = list(current) if isinstance(current, list) else []
+        return [v for v in base if v not in value.values]
+    if isinstance(value, dict):
+        return _apply(_copy(current) if isinstance(current, dict) else {}, value)
+    return _copy(value)
+
+
+def _apply(target: dict, data: dict, merge: bool = True) -> dict:
+    """Write `data` into `target` (nested maps merge when `merge`)."""
+    for key, value in data.items():
+        current = target.get(key, _MISSING)
+        if not merge and isinstance(value, dict):
+            current = _MISSING
+        result = _transform(current, value)
+        if result is _MISSING:
+            target.pop(key, None)
+        else:
+            target[key] = result
+    return target
+
+
+def _update(target: dict, data: dict) -> dict:
+    """Apply update() semantics: keys are dotted field paths."""
+    for field_path, value in data.items():
+        parts = field_path.split(".")
+        parent = target
+        for part in parts[:-1]:
+            if not isinstance(parent.get(part), dict):
+                parent[part] = {}
+            parent = parent[part]
+        result = _transform(parent.get(parts[-1], _MISSING), value)
+        if result is _MISSING:
+            parent.pop(parts[-1], None)
+        else:
+            parent[parts[-1]] = result
+    return target
+
+
+_TYPE_RANKS = {
+    type(None): 0,
+    bool: 1,
+    int: 2,
+    float: 2,
+    datetime: 3,
+    str: 4,
+    bytes: 5,
+    list: 8,
+    dict: 9,
+}
+
+
+def _type_rank(value) -> int:
+    # Firestore's cross-type ordering
+    rank = _TYPE_RANKS.get(type(value))
+    if rank is not None:
+        return rank
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, _BaseDocumentReference):
+        return 6
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 3 and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    elif rank == 6:
+        value = value.path
+    elif rank == 8:
+        value = tuple(_sort_key(v) for v in value)
+    elif rank == 9:
+        value = tuple((k, _sort_key(v)) for k, v in sorted(value.items()))
+    return (rank, value)
+
+
+@functools.total_ordering
+class _Descending:
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def _compare(op: str, actual, expected) -> bool:
+    if op == "==":
+        return _sort_key(actual) == _sort_key(expected)
+    if op == "!=":
+        return actual is not None and _sort_key(actual) != _sort_key(expected)
+    if op in ("<", "<=", ">", ">="):
+        if _type_rank(actual) != _type_rank(expected):
+            return False
+        a, b = _sort_key(actual), _sort_key(expected)
+        return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+    if op == "in":
+        return any(_sort_key(actual) == _sort_key(v) for v in expected)
+    if op == "not-in":
+        return actual is not None and all(
+            _sort_key(actual) != _sort_key(v) for v in expected
+        )
+    if op in ("array_contains", "array-contains"):
+        return isinstance(actual, list) and expected in actual
+    if op in ("array_contains_any", "array-contains-any"):
+        return isinstance(actual, list) and any(v in actual for v in expected)
+    raise NotImplementedError(f"Unsupported operator: {op}")
+
+
+class MemoryStore:
+    """The documents, grouped by collection path, plus RPC accounting."""
+
+    def __init__(self, latency_ms: float = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("MEMORY_FIRESTORE_LATENCY_MS", "0"))
+        self.latency = latency_ms / 1000
+        self.rpcs = 0
+        self._collections = {}  # collection path -> {document id: data}
+        self._watches = {}  # document or collection path -> [Watch]
+        self._lock = threading.RLock()
+
+    def rpc(self) -> None:
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def rpc_async(self) -> None:
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._collections.clear()
+            self.rpcs = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(docs) for docs in self._collections.values())
+
+    def read(self, path: str):
+        collection, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            return self._collections.get(collection, {}).get(doc_id)
+
+    def items(self, collection: str) -> list:
+        with self._lock:
+            return list(self._collections.get(collection, {}).items())
+
+    def collection_ids(self, parent: str = "") -> list:
+        prefix = f"{parent}/" if parent else ""
+        depth = prefix.count("/")
+        with self._lock:
+            return sorted(
+                {
+                    path[len(prefix):]
+                    for path, docs in self._collections.items()
+                    if docs and path.startswith(prefix) and path.count("/") == depth
+                }
+            )
+
+    def watch(self, watch) -> None:
+        with self._lock:
+            self._watches.setdefault(watch.path, []).append(watch)
+        watch.notify()
+
+    def unwatch(self, watch) -> None:
+        with self._lock:
+            watches = self._watches.get(watch.path, [])
+            if watch in watches:
+                watches.remove(watch)
+
+    def commit(self, writes: list) -> None:
+        """Apply (op, path, data, merge) writes atomically, then notify listeners."""
+        with self._lock:
+            staged = {}
+            for op, path, data, merge in writes:
+                current = staged.get(path, _MISSING)
+                if current is _MISSING:
+                    current = self.read(path)
+                if op == "create" and current is not None:
+                    raise AlreadyExists(f"Document already exists: {path}")
+                if op == "update" and current is None:
+                    raise NotFound(f"No document to update: {path}")
+
+                if op == "delete":
+                    staged[path] = None
+                elif op == "update":
+                    staged[path] = _update(_copy(current), data)
+                elif merge and current is not None:
+                    staged[path] = _apply(_copy(current), data)
+                else:
+                    staged[path] = _apply({}, data, merge=False)
+
+            for path, data in staged.items():
+                collection, doc_id = path.rsplit("/", 1)
+                docs = self._collections.setdefault(collection, {})
+                if data is None:
+                    docs.pop(doc_id, None)
+                else:
+                    docs[doc_id] = data
+
+            watches = []
+            for path in staged:
+                for target in (path, path.rsplit("/", 1)[0]):
+                    for watch in self._watches.get(target, ()):
+                        if watch not in watches:
+                            watches.append(watch)
+        for watch in watches:
+            watch.notify()
+
+
+class Watch:
+    """Handle returned by on_snapshot(); call unsubscribe() to stop listening."""
+
+    def __init__(self, store: MemoryStore, path: str, snapshots, callback):
+        self.path = path
+        self._store = store
+        self._snapshots = snapshots
+        self._callback = callback
+
+    def notify(self) -> None:
+        self._callback(self._snapshots(), [], datetime.now(timezone.utc))
+
+    def unsubscribe(self) -> None:
+        self._store.unwatch(self)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, field_paths=None):
+        self.reference = reference
+        self._data = data
+        self._field_paths = field_paths
+        self.read_time = datetime.now(timezone.utc)
+        self.create_time = self.update_time = None
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._field_paths is None:
+            return _copy(self._data)
+        projected = {}
+        for field_path in self._field_paths:
+            value = _get_field(self._data, field_path)
+            if value is not _MISSING:
+                _update(projected, {field_path: value})
+        return projected
+
+    def get(self, field_path: str):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+class _BaseDocumentReference:
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def __eq__(self, other):
+        return isinstance(other, _BaseDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.path}>"
+
+    @property
+    def parent(self):
+        return self._client.collection(self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str):
+        return self._client.collection(f"{self.path}/{collection_id}")
+
+    def _snapshot(self, field_paths=None) -> DocumentSnapshot:
+        return DocumentSnapshot(
+            self, self._client._store.read(self.path), field_paths
+        )
+
+    def _write(self, op: str, data=None, merge=False) -> None:
+        self._client._store.commit([(op, self.path, data, merge)])
+
+
+class DocumentReference(_BaseDocumentReference):
+    def get(self, field_paths=None, transaction=None) -> DocumentSnapshot:
+        self._client._store.rpc()
+        return self._snapshot(field_paths)
+
+    def set(self, document_data: dict, merge=False) -> None:
+        self._client._store.rpc()
+        self._write("set", document_data, merge)
+
+    def create(self, document_data: dict) -> None:
+        self._client._store.rpc()
+        self._write("create", document_data)
+
+    def update(self, field_updates: dict) -> None:
+        self._client._store.rpc()
+        self._write("update", field_updates)
+
+    def delete(self) -> None:
+        self._client._store.rpc()
+        self._write("delete")
+
+    def collections(self):
+        for collection_id in self._client._store.collection_ids(self.path):
+            yield self.collection(collection_id)
+
+    def on_snapshot(self, callback) -> Watch:
+        watch = Watch(
+            self._client._store, self.path, lambda: [self._snapshot()], callback
+        )
+        self._client._store.watch(watch)
+        return watch
+
+
+class AsyncDocumentReference(_BaseDocumentReference):
+    async def get(self, field_paths=None, transaction=None) -> DocumentSnapshot:
+        await self._client._store.rpc_async()
+        if transaction is not None:
+            transaction._reads.setdefault(
+                self.path, _copy(self._client._store.read(self.path))
+            )
+        return self._snapshot(field_paths)
+
+    async def set(self, document_data: dict, merge=False) -> None:
+        await self._client._store.rpc_async()
+        self._write("set", document_data, merge)
+
+    async def create(self, document_data: dict) -> None:
+        await self._client._store.rpc_async()
+        self._write("create", document_data)
+
+    async def update(self, field_updates: dict) -> None:
+        await self._client._store.rpc_async()
+        self._write("update", field_updates)
+
+    async def delete(self) -> None:
+        await self._client._store.rpc_async()
+        self._write("delete")
+
+    async def collections(self):
+        for collection_id in self._client._store.collection_ids(self.path):
+            yield self.collection(collection_id)
+
+
+class _BaseQuery:
+    def __init__(
+        self,
+        client,
+        collection_path: str,
+        filters=(),
+        orders=(),
+        limit=None,
+        cursor=None,
+        projection=None,
+    ):
+        self._client = client
+        self._path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+
+    def _derive(self, **changes):
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "cursor": self._cursor,
+            "projection": self._projection,
+        }
+        state.update(changes)
+        return self._query_class(self._client, self._path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is None:
+            filter = FieldFilter(field_path, op_string, value)
+        if not isinstance(filter, FieldFilter):
+            raise NotImplementedError("Only FieldFilter filters are supported")
+        return self._derive(
+            filters=self._filters
+            + ((filter.field_path, filter.op_string, filter.value),)
+        )
+
+    def order_by(self, field_path: str, direction: str = ASCENDING):
+        return self._derive(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._derive(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._derive(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths):
+        return self._derive(projection=list(field_paths))
+
+    def count(self, alias: str = None):
+        return self._aggregation_class(self, alias or "field_1")
+
+    def _orders_with_name(self) -> tuple:
+        # Like Firestore, break ties by document name in the last direction used
+        direction = self._orders[-1][1] if self._orders else ASCENDING
+        return self._orders + (("__name__", direction),)
+
+    def _key(self, doc_id: str, data: dict, orders: tuple, wrap: bool):
+        key = []
+        for field_path, direction in orders:
+            value = doc_id if field_path == "__name__" else _get_field(data, field_path)
+            if value is _MISSING:
+                return None  # documents without an order_by field are excluded
+            value = _sort_key(value)
+            key.append(_Descending(value) if wrap and direction == DESCENDING else value)
+        return tuple(key)
+
+    def _cursor_key(self, orders: tuple, wrap: bool):
+        cursor = self._cursor
+        if isinstance(cursor, DocumentSnapshot):
+            return self._key(cursor.id, cursor._data or {}, orders, wrap)
+        # A dict of field values positions on the explicit order_by fields only
+        return self._key("", cursor, orders[:-1], wrap)
+
+    def _matches(self, data: dict) -> bool:
+        for field_path, op, expected in self._filters:
+            actual = _get_field(data, field_path)
+            if actual is _MISSING or not _compare(op, actual, expected):
+                return False
+        return True
+
+    def _run(self) -> list:
+        orders = self._orders_with_name()
+        # With a single direction, compare plain keys (reversed when descending)
+        # instead of wrapping every descending value.
+        directions = {direction for _, direction in orders}
+        wrap = len(directions) > 1
+        reverse = directions == {DESCENDING}
+
+        keyed = []
+        for doc_id, data in self._client._store.items(self._path):
+            if not self._matches(data):
+                continue
+            key = self._key(doc_id, data, orders, wrap)
+            if key is not None:
+                keyed.append((key, doc_id, data))
+
+        if self._cursor is not None:
+            cursor_key = self._cursor_key(orders, wrap)
+            size = len(cursor_key)
+            if reverse:
+                keyed = [item for item in keyed if item[0][:size] < cursor_key]
+            else:
+                keyed = [item for item in keyed if item[0][:size] > cursor_key]
+
+        by_key = lambda item: item[0]
+        if self._limit is not None:
+            pick = heapq.nlargest if reverse else heapq.nsmallest
+            keyed = pick(self._limit, keyed, key=by_key)
+        else:
+            keyed.sort(key=by_key, reverse=reverse)
+
+        document = self._client._document_class
+        return [
+            DocumentSnapshot(
+                document(self._client, f"{self._path}/{doc_id}"), data, self._projection
+            )
+            for _, doc_id, data in keyed
+        ]
+
+
+class Query(_BaseQuery):
+    def stream(self, transaction=None):
+        self._client._store.rpc()
+        yield from self._run()
+
+    def get(self, transaction=None) -> list:
+        return list(self.stream(transaction))
+
+
+class AsyncQuery(_BaseQuery):
+    async def stream(self, transaction=None):
+        await self._client._store.rpc_async()
+        for snapshot in self._run():
+            yield snapshot
+
+    async def get(self, transaction=None) -> list:
+        return [snapshot async for snapshot in self.stream(transaction)]
+
+
+class AggregationResult:
+    def __init__(self, alias: str, value):
+        self.alias = alias
+        self.value = value
+        self.read_time = datetime.now(timezone.utc)
+
+
+class _BaseAggregationQuery:
+    def __init__(self, query, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def _result(self) -> list:
+        return [[AggregationResult(self._alias, len(self._query._run()))]]
+
+
+class AggregationQuery(_BaseAggregationQuery):
+    def get(self, transaction=None) -> list:
+        self._query._client._store.rpc()
+        return self._result()
+
+
+class AsyncAggregationQuery(_BaseAggregationQuery):
+    async def get(self, transaction=None) -> list:
+        await self._query._client._store.rpc_async()
+        return self._result()
+
+
+Query._query_class = Query
+AsyncQuery._query_class = AsyncQuery
+Query._aggregation_class = AggregationQuery
+AsyncQuery._aggregation_class = AsyncAggregationQuery
+
+
+class _CollectionMixin:
+    @property
+    def id(self) -> str:
+        return self._path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self._path:
+            return None
+        return self._client.document(self._path.rsplit("/", 1)[0])
+
+    def document(self, document_id: str = None):
+        return self._client.document(f"{self._path}/{document_id or _auto_id()}")
+
+
+class CollectionReference(_CollectionMixin, Query):
+    def add(self, document_data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self):
+        for doc_id, _ in self._client._store.items(self._path):
+            yield self.document(doc_id)
+
+    def on_snapshot(self, callback) -> Watch:
+        def snapshots():
+            return [
+                self.document(doc_id)._snapshot()
+                for doc_id, _ in self._client._store.items(self._path)
+            ]
+
+        watch = Watch(self._client._store, self._path, snapshots, callback)
+        self._client._store.watch(watch)
+        return watch
+
+
+class AsyncCollectionReference(_CollectionMixin, AsyncQuery):
+    async def add(self, document_data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        await ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    async def list_documents(self):
+        for doc_id, _ in self._client._store.items(self._path):
+            yield self.document(doc_id)
+
+
+class _BaseWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, reference, document_data: dict, merge=False) -> None:
+        self._writes.append(("set", reference.path, document_data, merge))
+
+    def create(self, reference, document_data: dict) -> None:
+        self._writes.append(("create", reference.path, document_data, False))
+
+    def update(self, reference, field_updates: dict) -> None:
+        self._writes.append(("update", reference.path, field_updates, False))
+
+    def delete(self, reference) -> None:
+        self._writes.append(("delete", reference.path, None, False))
+
+    def _flush(self) -> list:
+        writes, self._writes = self._writes, []
+        self._client._store.commit(writes)
+        return [None] * len(writes)
+
+
+class WriteBatch(_BaseWriteBatch):
+    def commit(self) -> list:
+        self._client._store.rpc()
+        return self._flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class AsyncWriteBatch(_BaseWriteBatch):
+    async def commit(self) -> list:
+        await self._client._store.rpc_async()
+        return self._flush()
+
+
+class Transaction(WriteBatch):
+    """Drives @firestore.transactional the same way a real Transaction does."""
+
+    _ids = iter(range(1, 2**63))
+
+    def __init__(self, client, max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None) -> None:
+        self._id = f"memory-{next(Transaction._ids)}".encode()
+
+    def _rollback(self) -> None:
+        self._clean_up()
+
+    def _commit(self) -> list:
+        results = self.commit()
+        self._clean_up()
+        return results
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, _BaseDocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+
+class AsyncTransaction(AsyncWriteBatch):
+    """Drives @firestore.async_transactional; commits only if nothing it read changed."""
+
+    def __init__(self, client, max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}  # path -> data as first read in this attempt
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    async def _begin(self, retry_id=None) -> None:
+        self._id = f"memory-{next(Transaction._ids)}".encode()
+
+    async def _rollback(self) -> None:
+        self._clean_up()
+
+    async def _commit(self) -> list:
+        store = self._client._store
+        await store.rpc_async()
+        with store._lock:
+            for path, data in self._reads.items():
+                if store.read(path) != data:
+                    raise Aborted(f"Document changed during transaction: {path}")
+            results = self._flush()
+        self._clean_up()
+        return results
+
+    async def get(self, ref_or_query):
+        if isinstance(ref_or_query, _BaseDocumentReference):
+            return await ref_or_query.get(transaction=self)
+        return ref_or_query.stream(transaction=self)
+
+
+class MemoryClient:
+    """Synchronous client over a MemoryStore (stand-in for firestore.Client)."""
+
+    _document_class = DocumentReference
+    _collection_class = CollectionReference
+
+    def __init__(self, store: MemoryStore = None, project: str = "memory"):
+        self._store = store if store is not None else MemoryStore()
+        self.project = project
+
+    @property
+    def store(self) -> MemoryStore:
+        return self._store
+
+    def collection(self, *collection_path: str):
+        return self._collection_class(self, "/".join(collection_path))
+
+    def document(self, *document_path: str):
+        return self._document_class(self, "/".join(document_path))
+
+    def collections(self):
+        for collection_id in self._store.collection_ids():
+            yield self.collection(collection_id)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        self._store.rpc()
+        for ref in references:
+            yield ref._snapshot(field_paths)
+
+
+class MemoryAsyncClient(MemoryClient):
+    """Async client over a MemoryStore (stand-in for firestore.AsyncClient)."""
+
+    _document_class = AsyncDocumentReference
+    _collection_class = AsyncCollectionReference
+
+    async def collections(self):
+        for collection_id in self._store.collection_ids():
+            yield self.collection(collection_id)
+
+    def batch(self) -> AsyncWriteBatch:
+        return AsyncWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False):
+        return AsyncTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        await self._store.rpc_async()
+        for ref in references:
+            yield ref._snapshot(field_paths)
@@ -0,0 +1,253 @@
+# services/metrics.py
+#
+# Minimal in-process Prometheus-style metrics, rendered in the text
+# exposition format at GET /metrics. Counters and histograms are per worker
+# process; scrape each worker (or run a single worker per container).
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(names, key + (bound,))} {cumulative}"
+                    )
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {series[-1]}"
+                )
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # name -> zero-argument callable returning a stats dict with at least
+        # hits/misses/size; read at scrape time
+        self._caches = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, stats_fn) -> None:
+        self._caches[name] = stats_fn
+
+    def _collect_caches(self) -> list:
+        families = {
+            "cache_hits_total": ("counter", "Cache hits", "hits"),
+            "cache_misses_total": ("counter", "Cache misses", "misses"),
+            "cache_entries": ("gauge", "Entries currently cached", "size"),
+            "cache_hit_ratio": ("gauge", "Hits / lookups since start", "hit_rate"),
+            "cache_bytes": ("gauge", "Approximate memory held by the cache", "bytes"),
+            "cache_listeners": ("gauge", "Firestore listeners held by the cache", "listeners"),
+        }
+        stats = {}
+        for name, stats_fn in self._caches.items():
+            try:
+                stats[name] = stats_fn()
+            except Exception:
+                continue
+        lines = []
+        for metric, (kind, documentation, field) in families.items():
+            lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"]
+            for name, values in sorted(stats.items()):
+                if field in values:
+                    lines.append(f'{metric}{{cache="{name}"}} {values[field]}')
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        lines.extend(self._collect_caches())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ("method", "route", "status"),
+    )
+)
+firestore_operations = registry.register(
+    Counter(
+        "firestore_operations_total",
+        "Firestore reads/queries/writes by collection",
+        ("collection", "operation"),
+    )
+)
+firestore_duration = registry.register(
+    Histogram(
+        "firestore_operation_duration_seconds",
+        "Firestore call latency by collection",
+        ("collection", "operation"),
+    )
+)
+firestore_reads_per_request = registry.register(
+    Histogram(
+        "firestore_document_reads_per_request",
+        "Document reads per request through the identity map, by outcome",
+        ("route", "kind"),
+        buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+    )
+)
+gemini_duration = registry.register(
+    Histogram(
+        "gemini_request_duration_seconds",
+        "Gemini call latency",
+        ("model", "mode"),
+        buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0),
+    )
+)
+gemini_tokens = registry.register(
+    Counter("gemini_tokens_total", "Gemini tokens used", ("model", "kind"))
+)
+admission_decisions = registry.register(
+    Counter(
+        "admission_decisions_total",
+        "LLM route admissions: admitted, rejected (429) or coalesced",
+        ("scope", "outcome"),
+    )
+)
+jobs_total = registry.register(
+    Counter(
+        "jobs_total",
+        "Background jobs: enqueued, deduplicated, succeeded, retried, failed, lost",
+        ("kind", "outcome"),
+    )
+)
+job_duration = registry.register(
+    Histogram(
+        "job_duration_seconds",
+        "Background job attempt duration",
+        ("kind",),
+        buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0),
+    )
+)
+client_init_duration = registry.register(
+    Gauge("client_init_seconds", "Time to create each shared client", ("client",))
+)
+app_startup_duration = registry.register(
+    Gauge(
+        "app_startup_seconds",
+        "Worker boot time: importing routes, and warming up clients",
+        ("phase",),
+    )
+)
+
+
+@contextmanager
+def observe_firestore(collection: str, operation: str):
+    """Count and time one Firestore call (works around sync or awaited calls)."""
+    firestore_operations.inc(collection=collection, operation=operation)
+    with firestore_duration.time(collection=collection, operation=operation):
+        yield
+
+
+def record_gemini_usage(model_name: str, response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    gemini_tokens.inc(
+        getattr(usage, "prompt_token_count", 0) or 0, model=model_name, kind="prompt"
+    )
+    gemini_tokens.inc(
+        getattr(usage, "candidates_token_count", 0) or 0,
+        model=model_name,
+        kind="completion",
+    )
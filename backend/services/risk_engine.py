@@ -0,0 +1,137 @@
+# services/risk_engine.py
+#
+# Deterministic risk scoring. A fixed logistic model over a handful of
+# financial ratios replaces the free-text "High/Medium/Low" parsing of a
+# Gemini reply, so a score costs microseconds instead of an LLM round trip.
+# The same weights score one user or a whole feature matrix.
+
+from typing import Dict, List
+
+import numpy as np
+from pydantic import BaseModel
+
+ENGINE_VERSION = "logistic-v1"
+
+FEATURES = (
+    "debt_service_ratio",  # monthly installments / income
+    "expense_ratio",  # expenses / income
+    "debt_to_assets",  # remaining debt / total asset value
+    "dependents_count",
+    "missed_payments",
+    "has_default_history",
+)
+
+# Ratios are clipped so a user with no recorded income or assets lands at the
+# top of the scale instead of at infinity.
+FEATURE_CAPS = np.array([3.0, 3.0, 3.0, 5.0, 6.0, 1.0])
+WEIGHTS = np.array([4.0, 2.0, 0.8, 0.25, 0.5, 2.0])
+BIAS = -3.5
+
+LOW_THRESHOLD = 0.35
+HIGH_THRESHOLD = 0.65
+# Probabilities this close to a threshold are reported as not confident.
+UNCERTAINTY_MARGIN = 0.05
+
+REASONS = {
+    "debt_service_ratio": "monthly installments take {pct} of income",
+    "expense_ratio": "expenses are {pct} of income",
+    "debt_to_assets": "remaining debt is {pct} of total asset value",
+    "dependents_count": "{value:.0f} financial dependent(s)",
+    "missed_payments": "{value:.0f} missed payment(s) on record",
+    "has_default_history": "a history of loan default",
+}
+
+
+class RiskAssessment(BaseModel):
+    risk_level: str
+    probability: float
+    confident: bool
+    features: Dict[str, float]
+    explanation: str
+    engine_version: str = ENGINE_VERSION
+
+
+def _ratio(numerator: float, denominator: float, cap: float) -> float:
+    if denominator > 0:
+        return float(min(numerator / denominator, cap))
+    return float(cap) if numerator > 0 else 0.0
+
+
+def extract_features(
+    aggregates: dict, dependents: dict, credit_history: dict
+) -> Dict[str, float]:
+    income = aggregates.get("total_income", 0)
+    total_assets = aggregates.get("total_assets", 0)
+    return {
+        "debt_service_ratio": _ratio(
+            aggregates.get("total_cicilan_perbulan", 0), income, FEATURE_CAPS[0]
+        ),
+        "expense_ratio": _ratio(
+            aggregates.get("total_expense", 0), income, FEATURE_CAPS[1]
+        ),
+        "debt_to_assets": _ratio(
+            aggregates.get("total_utang", 0), total_assets, FEATURE_CAPS[2]
+        ),
+        "dependents_count": float(dependents.get("dependents_count", 0) or 0),
+        "missed_payments": float(credit_history.get("missed_payments", 0) or 0),
+        "has_default_history": float(bool(credit_history.get("has_default_history"))),
+    }
+
+
+def feature_matrix(rows: List[Dict[str, float]]) -> np.ndarray:
+    if not rows:
+        return np.zeros((0, len(FEATURES)))
+    return np.array([[row[name] for name in FEATURES] for row in rows], dtype=float)
+
+
+def score_matrix(X: np.ndarray) -> np.ndarray:
+    """Risk probability for every row of an (n_users, n_features) matrix."""
+    X = np.minimum(X, FEATURE_CAPS)
+    return 1.0 / (1.0 + np.exp(-(X @ WEIGHTS + BIAS)))
+
+
+def classify(probabilities: np.ndarray) -> np.ndarray:
+    return np.where(
+        probabilities >= HIGH_THRESHOLD,
+        "High",
+        np.where(probabilities >= LOW_THRESHOLD, "Medium", "Low"),
+    )
+
+
+def is_confident(probabilities: np.ndarray) -> np.ndarray:
+    return (np.abs(probabilities - LOW_THRESHOLD) > UNCERTAINTY_MARGIN) & (
+        np.abs(probabilities - HIGH_THRESHOLD) > UNCERTAINTY_MARGIN
+    )
+
+
+def explain(features: Dict[str, float], risk_level: str) -> str:
+    """Template explanation naming the features that pushed the score most."""
+    contributions = sorted(
+        (
+            (weight * min(features[name], cap), name)
+            for name, weight, cap in zip(FEATURES, WEIGHTS, FEATURE_CAPS)
+        ),
+        reverse=True,
+    )
+    reasons = [
+        REASONS[name].format(
+            pct=f"{features[name]:.0%}", value=features[name]
+        )
+        for contribution, name in contributions[:2]
+        if contribution > 0
+    ]
+    if not reasons:
+        return f"{risk_level} risk: no debt, expense or credit-history pressure recorded."
+    return f"{risk_level} risk: " + " and ".join(reasons) + "."
+
+
+def assess(features: Dict[str, float]) -> RiskAssessment:
+    probability = score_matrix(feature_matrix([features]))[0]
+    risk_level = str(classify(np.array([probability]))[0])
+    return RiskAssessment(
+        risk_level=risk_level,
+        probability=round(float(probability), 4),
+        confident=bool(is_confident(np.array([probability]))[0]),
+        features=features,
+        explanation=explain(features, risk_level),
+    )
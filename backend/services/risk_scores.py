@@ -0,0 +1,69 @@
+# services/risk_scores.py
+#
+# Stored risk scores. Every score is appended to users/{user_id}/risk_scores
+# and copied to users/{user_id}/latest_risk_score/main, so the current score
+# is one document read. Each score carries a fingerprint of the inputs it was
+# computed from; while the fingerprint still matches, the stored score is
+# current and regenerating it would give the same answer.
+
+import hashlib
+import json
+
+from services.aggregates import TOTAL_FIELDS, VERSION_FIELDS
+from services.firestore import db, forget
+from services.risk_engine import ENGINE_VERSION
+
+
+def latest_risk_ref(user_id: str, client=None):
+    return (
+        (client or db)
+        .collection("users")
+        .document(user_id)
+        .collection("latest_risk_score")
+        .document("main")
+    )
+
+
+def input_fingerprint(
+    profile: dict, aggregates: dict, dependents: dict, credit_history: dict
+) -> str:
+    """Hash of everything a score (and its Gemini explanation) depends on.
+
+    The aggregates version counters change on every transaction, loan and
+    asset write; dependents, credit history and the profile are small enough
+    to hash whole.
+    """
+    inputs = {
+        "engine_version": ENGINE_VERSION,
+        "aggregates": {
+            field: aggregates.get(field, 0) for field in TOTAL_FIELDS + VERSION_FIELDS
+        },
+        "dependents": dependents,
+        "credit_history": credit_history,
+        "profile": profile,
+    }
+    encoded = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def is_current(latest: dict, fingerprint: str, explain: bool = False) -> bool:
+    """Whether the stored latest score can be returned instead of a new one."""
+    if not latest or latest.get("fingerprint") != fingerprint:
+        return False
+    # A score stored without a Gemini explanation doesn't satisfy explain=true
+    return not explain or latest.get("generated_by_ai", False)
+
+
+def record_score(writer, user_id: str, score: dict, fingerprint: str | None) -> str:
+    """Queue the history document and the latest pointer on a batch.
+
+    Returns the new history document's ID.
+    """
+    history_ref = (
+        db.collection("users").document(user_id).collection("risk_scores").document()
+    )
+    record = {**score, "fingerprint": fingerprint}
+    writer.set(history_ref, record)
+    writer.set(latest_risk_ref(user_id), {**record, "score_id": history_ref.id})
+    forget(latest_risk_ref(user_id))
+    return history_ref.id
@@ -0,0 +1,199 @@
+# services/snapshot.py
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from services.aggregates import (
+    aggregates_from_snapshot,
+    aggregates_from_snapshot_async,
+    aggregates_ref,
+)
+from services.firestore import async_db, db, get_documents, get_documents_async
+from services.log import get_logger
+from services.metrics import observe_firestore
+from services.risk_scores import latest_risk_ref
+
+logger = get_logger(__name__)
+
+# Firestore's Python client is blocking, so the sub-collections are streamed on
+# a small shared pool while the profile and the single "main" documents are
+# fetched together in one get_all() round trip.
+SNAPSHOT_MAX_WORKERS = int(os.getenv("SNAPSHOT_MAX_WORKERS", "8"))
+_executor = ThreadPoolExecutor(
+    max_workers=SNAPSHOT_MAX_WORKERS, thread_name_prefix="snapshot"
+)
+
+COLLECTION_SECTIONS = ("loans", "assets", "transactions")
+# Single "main" documents and the defaults their GET endpoints return
+DOCUMENT_SECTIONS = {
+    "dependents": ("financial_dependents", {"dependents_count": 0}),
+    "credit_history": (
+        "credit_history",
+        {"total_loans_taken": 0, "missed_payments": 0, "has_default_history": False},
+    ),
+}
+ALL_SECTIONS = COLLECTION_SECTIONS + tuple(DOCUMENT_SECTIONS) + ("aggregates",)
+# Fetched in the same get_all() when asked for; empty when never scored
+OPTIONAL_SECTIONS = ("latest_risk_score",)
+
+
+class UserFinancialSnapshot(BaseModel):
+    user_id: str
+    profile: dict
+    loans: List[dict] = Field(default_factory=list)
+    assets: List[dict] = Field(default_factory=list)
+    transactions: List[dict] = Field(default_factory=list)
+    dependents: dict = Field(default_factory=dict)
+    credit_history: dict = Field(default_factory=dict)
+    aggregates: dict = Field(default_factory=dict)
+    latest_risk_score: dict = Field(default_factory=dict)
+    # Milliseconds spent on each collection fetch and on the batched document
+    # read ("documents"), plus "total" for the wall-clock time.
+    timings: Dict[str, float] = Field(default_factory=dict)
+
+
+def _user_ref(user_id: str, client=None):
+    return (client or db).collection("users").document(user_id)
+
+
+def _document_refs(user_id: str, sections: tuple, client=None) -> dict:
+    """Refs of the single documents a snapshot needs, fetched with one get_all()."""
+    user_ref = _user_ref(user_id, client)
+    refs = {"profile": user_ref}
+    for name in sections:
+        if name in DOCUMENT_SECTIONS:
+            refs[name] = user_ref.collection(DOCUMENT_SECTIONS[name][0]).document("main")
+        elif name == "aggregates":
+            refs[name] = aggregates_ref(user_id, client)
+        elif name == "latest_risk_score":
+            refs[name] = latest_risk_ref(user_id, client)
+    return refs
+
+
+def _from_document(name: str, doc):
+    if name == "profile":
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="User not found")
+        return doc.to_dict()
+    if name == "latest_risk_score":
+        return doc.to_dict() if doc.exists else {}
+    default = DOCUMENT_SECTIONS[name][1]
+    return {**default, **doc.to_dict()} if doc.exists else dict(default)
+
+
+def _fetch_documents(user_id: str, sections: tuple) -> dict:
+    refs = _document_refs(user_id, sections)
+    docs = dict(zip(refs, get_documents(refs.values())))
+    data = {}
+    for name, doc in docs.items():
+        if name == "aggregates":
+            data[name] = aggregates_from_snapshot(user_id, doc)
+        else:
+            data[name] = _from_document(name, doc)
+    return data
+
+
+def _fetch_collection(user_id: str, name: str) -> list:
+    with observe_firestore(name, "query"):
+        return [doc.to_dict() for doc in _user_ref(user_id).collection(name).stream()]
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def _fetch_documents_async(user_id: str, sections: tuple) -> dict:
+    refs = _document_refs(user_id, sections, client=async_db)
+    docs = dict(zip(refs, await get_documents_async(refs.values())))
+    data = {}
+    for name, doc in docs.items():
+        if name == "aggregates":
+            data[name] = await aggregates_from_snapshot_async(user_id, doc)
+        else:
+            data[name] = _from_document(name, doc)
+    return data
+
+
+async def _fetch_collection_async(user_id: str, name: str) -> list:
+    user_ref = _user_ref(user_id, client=async_db)
+    with observe_firestore(name, "query"):
+        return [doc.to_dict() async for doc in user_ref.collection(name).stream()]
+
+
+async def _timed_async(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _check_sections(sections: Iterable[str]) -> tuple:
+    sections = tuple(sections)
+    unknown = set(sections) - set(ALL_SECTIONS + OPTIONAL_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown snapshot sections: {sorted(unknown)}")
+    return sections
+
+
+def _build_snapshot(user_id: str, data: dict, timings: dict) -> UserFinancialSnapshot:
+    logger.debug(
+        "snapshot.loaded",
+        extra={
+            "fields": {
+                "user_id": user_id,
+                "timings_ms": {k: round(v, 1) for k, v in timings.items()},
+            }
+        },
+    )
+    return UserFinancialSnapshot(user_id=user_id, timings=timings, **data)
+
+
+def load_user_snapshot(
+    user_id: str, sections: Iterable[str] = ALL_SECTIONS
+) -> UserFinancialSnapshot:
+    """Fetch the user profile and the requested sub-collections concurrently."""
+    sections = _check_sections(sections)
+
+    timings = {}
+    start = time.perf_counter()
+    # Each worker runs in a copy of the caller's context so reads land in the
+    # request's identity map.
+    futures = {
+        name: _executor.submit(
+            contextvars.copy_context().run, _timed, _fetch_collection, user_id, name
+        )
+        for name in sections
+        if name in COLLECTION_SECTIONS
+    }
+    data, timings["documents"] = _timed(_fetch_documents, user_id, sections)
+    for name, future in futures.items():
+        data[name], timings[name] = future.result()
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return _build_snapshot(user_id, data, timings)
+
+
+async def load_user_snapshot_async(
+    user_id: str, sections: Iterable[str] = ALL_SECTIONS
+) -> UserFinancialSnapshot:
+    """Event-loop variant of load_user_snapshot using the async Firestore client."""
+    sections = _check_sections(sections)
+
+    timings = {}
+    start = time.perf_counter()
+    collections = tuple(name for name in sections if name in COLLECTION_SECTIONS)
+    (data, timings["documents"]), *fetched = await asyncio.gather(
+        _timed_async(_fetch_documents_async(user_id, sections)),
+        *(_timed_async(_fetch_collection_async(user_id, name)) for name in collections),
+    )
+
+    for name, (result, elapsed) in zip(collections, fetched):
+        data[name], timings[name] = result, elapsed
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return _build_snapshot(user_id, data, timings)
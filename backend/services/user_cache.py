@@ -0,0 +1,218 @@
+# services/user_cache.py
+#
+# Optional in-process cache of the rarely changing per-user data behind the
+# plain read endpoints: profile, loans, assets, credit history and dependents.
+# Users are kept in LRU order, at most USER_CACHE_MAX_USERS of them.
+#
+# A cached section is dropped when its data changes:
+# - by the route that wrote it, in this process (always), and
+# - by a Firestore on_snapshot() listener attached when the section is first
+#   cached, which also catches writes from other workers and from clients
+#   writing to Firestore directly (USER_CACHE_LISTENERS, on by default).
+# On Firestore a listener's first callback (the initial state) can arrive after
+# the section was loaded and drop it once more: an extra load, never a stale
+# read. A load that overlaps an invalidation is returned but not cached.
+#
+# Listeners are the expensive part. Firestore cannot watch a document together
+# with its subcollections, so a cached user holds one listener per section read
+# so far, up to five. Each is a long-lived stream with its own thread in the
+# client, and every change it reports is a billed read. The default capacity is
+# therefore 200 users (at most 1000 listeners per worker) with listeners on,
+# and 1000 users with them off.
+#
+# USER_CACHE            1 to enable (default off)
+# USER_CACHE_MAX_USERS  LRU bound, in users
+# USER_CACHE_LISTENERS  0 to rely on this process's write paths only
+
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from services.firestore import db
+from services.log import get_logger
+from services.metrics import registry
+
+logger = get_logger(__name__)
+
+SECTIONS = ("profile", "loans", "assets", "credit_history", "dependents")
+
+
+def _target(user_id: str, section: str):
+    """The document or collection a section is read from."""
+    user_ref = db.collection("users").document(user_id)
+    if section == "profile":
+        return user_ref
+    if section in ("loans", "assets"):
+        return user_ref.collection(section)
+    if section == "dependents":
+        return user_ref.collection("financial_dependents").document("main")
+    return user_ref.collection(section).document("main")
+
+
+def _footprint(value) -> int:
+    """Approximate size of a cached value, in bytes of its JSON encoding."""
+    return len(json.dumps(value, default=str))
+
+
+class _Entry:
+    def __init__(self):
+        self.values = {}  # section -> value
+        self.sizes = {}  # section -> footprint
+        self.generations = {}  # section -> invalidation count
+        self.watches = {}  # section -> listener handle
+
+
+class UserDataCache:
+    def __init__(self, max_users: int, listen: bool = True, target=_target):
+        self.max_users = max_users
+        self.listen = listen
+        self._target = target
+        self._entries = OrderedDict()  # user_id -> _Entry, least recently used first
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def get(self, user_id: str, section: str, loader):
+        """The cached section, or loader()'s result (cached for next time).
+
+        Callers get their own copy, so they may modify it.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                if section in entry.values:
+                    self.hits += 1
+                    return copy.deepcopy(entry.values[section])
+            self.misses += 1
+            if entry is None:
+                entry = self._add(user_id)
+            needs_watch = self.listen and section not in entry.watches
+
+        if needs_watch:
+            self._watch(user_id, section, entry)
+        with self._lock:
+            generation = entry.generations.get(section, 0)
+
+        value = loader()
+
+        with self._lock:
+            # Store unless the section changed (or the user was evicted) meanwhile
+            if (
+                self._entries.get(user_id) is entry
+                and entry.generations.get(section, 0) == generation
+            ):
+                size = _footprint(value)
+                self.bytes += size - entry.sizes.get(section, 0)
+                entry.values[section] = value
+                entry.sizes[section] = size
+        return copy.deepcopy(value)
+
+    def invalidate(self, user_id: str, *sections: str) -> None:
+        """Drop the given sections (all of them by default) for one user."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            for section in sections or SECTIONS:
+                entry.generations[section] = entry.generations.get(section, 0) + 1
+                if section in entry.values:
+                    del entry.values[section]
+                    self.bytes -= entry.sizes.pop(section)
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self.bytes = 0
+        for entry in entries:
+            self._unsubscribe(entry)
+
+    def _add(self, user_id: str) -> _Entry:
+        entry = self._entries[user_id] = _Entry()
+        while len(self._entries) > self.max_users:
+            _, old = self._entries.popitem(last=False)
+            self.evictions += 1
+            self.bytes -= sum(old.sizes.values())
+            if old.watches:
+                # Closing a listener can block; keep it off the request path
+                threading.Thread(
+                    target=self._unsubscribe, args=(old,), daemon=True
+                ).start()
+        return entry
+
+    def _watch(self, user_id: str, section: str, entry: _Entry) -> None:
+        try:
+            watch = self._target(user_id, section).on_snapshot(
+                lambda *_: self.invalidate(user_id, section)
+            )
+        except Exception as e:
+            # Without a listener, this process's write paths still invalidate
+            logger.warning(
+                "user_cache.listener_failed",
+                extra={"fields": {"user_id": user_id, "section": section, "error": str(e)}},
+            )
+            return
+        with self._lock:
+            if self._entries.get(user_id) is entry and section not in entry.watches:
+                entry.watches[section] = watch
+                return
+        watch.unsubscribe()
+
+    @staticmethod
+    def _unsubscribe(entry: _Entry) -> None:
+        for watch in list(entry.watches.values()):
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+        entry.watches.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": sum(len(e.values) for e in self._entries.values()),
+                "users": len(self._entries),
+                "bytes": self.bytes,
+                "listeners": sum(len(e.watches) for e in self._entries.values()),
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _build_cache():
+    if os.getenv("USER_CACHE", "0") != "1":
+        return None
+    listen = os.getenv("USER_CACHE_LISTENERS", "1") != "0"
+    return UserDataCache(
+        max_users=int(os.getenv("USER_CACHE_MAX_USERS", "200" if listen else "1000")),
+        listen=listen,
+    )
+
+
+user_cache = _build_cache()
+if user_cache is not None:
+    registry.register_cache("user_data", user_cache.stats)
+
+
+def cached(user_id: str, section: str, loader):
+    """Read a section through the cache when it is enabled."""
+    if user_cache is None:
+        return loader()
+    return user_cache.get(user_id, section, loader)
+
+
+def invalidate(user_id: str, *sections: str) -> None:
+    """Call after writing a section (no sections: everything for the user)."""
+    if user_cache is not None:
+        user_cache.invalidate(user_id, *sections)
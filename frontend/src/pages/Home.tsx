@@ -172,10 +172,13 @@ export default function Dashboard() {
 
   useEffect(() => {
     const fetchRiskScore = async () => {
-      if (!userId) return;
+      const user = auth.currentUser;
+      if (!userId || !user) return;
       try {
+        const token = await user.getIdToken();
         const response = await fetch(`https://debtwatch-full-production.up.railway.app/users/${userId}/risk_scores/generate`, {
           method: 'POST',
+          headers: { Authorization: `Bearer ${token}` },
         });
         if (!response.ok) throw new Error('Gagal mengambil data risiko keuangan');
         const data = await response.json();